@@ -59,3 +59,8 @@ else:  # assume mistral
     # ==========
     meteosat_georef_file = '%s/msevi-nawdex-20160923.nc' % nawdex_meteosat_dir
     nawdex_regions_file = '%s/region_masks_for_msevi_nawdex.h5' % nawdex_dir
+
+
+# Cache Dir (for static, derived data, e.g. reprojection parameters)
+# ==========
+cache_dir = '%s/cache' % nawdex_dir
@@ -5,6 +5,8 @@ Tools for input of simulated data.
 '''
 
 import os, sys, copy
+import threading
+from collections import OrderedDict
 import numpy as np
 import datetime
 import xarray as xr
@@ -15,9 +17,9 @@ import tropy.io_tools.netcdf as ncio
 import tropy.analysis_tools.grid_and_interpolation as gi
 
 from ..config import nawdex_dir
-from ..config import nawdex_regions_file
-from ..io.tools import convert_time
+from ..io.tools import convert_time, netcdf_lock
 from ..io import selector
+from ..io import region_masks
 
 ######################################################################
 # (1) Regridded Data for Further Analysis
@@ -43,16 +45,132 @@ def read_mask( region = 'full_region'):
 
     '''
 
-    # also get mask
-    mfile = nawdex_regions_file
-    dset = {'mask' : hio.read_var_from_hdf(mfile, region) }
+    # also get mask (shared and read-only)
+    dset = {'mask' : region_masks.get_region_mask( region ) }
     
     return dset
 
 ######################################################################
 ######################################################################
 
-def read_data_field( fname, time, varname, region = 'full_region' ):
+# LRU store of open level-2 files (handle, georef and time objects per file)
+lev2_handle_cache = OrderedDict()
+lev2_handle_cache_size = 8
+
+lev2_handle_lock = threading.Lock()
+
+
+def get_lev2_handle( fname ):
+
+    '''
+    Returns the cached session entry of a level-2 file (opened on first request).
+
+    Entries are keyed by absolute file name and modification time and kept
+    in a small LRU store. Evicted entries are only dropped from the store 
+    (not closed), i.e. datasets still used by other callers stay valid and
+    are closed by garbage collection.
+
+
+    Parameters
+    ----------
+    fname : str
+        input data file name
+
+
+    Returns
+    --------
+    entry : dict
+        session entry with open dataset 'xset', georef 'geo' (None until
+        first requested), per-index time objects 'time_obj' and a 'lock'
+        for filling the lazy entries
+    '''
+
+    fname = os.path.abspath( fname )
+    key = ( fname, os.path.getmtime( fname ) )
+
+    with lev2_handle_lock:
+
+        if key in lev2_handle_cache:
+            lev2_handle_cache.move_to_end( key )
+            return lev2_handle_cache[key]
+
+        # outdated entries of the same file are dropped
+        for k in [k for k in lev2_handle_cache if k[0] == fname]:
+            del lev2_handle_cache[k]
+
+        with netcdf_lock:
+            xset = xr.open_dataset( fname )
+
+        entry = {'xset' : xset,
+                 'geo' : None,
+                 'time_obj' : {},
+                 'lock' : threading.Lock() }
+
+        lev2_handle_cache[key] = entry
+
+        while len( lev2_handle_cache ) > lev2_handle_cache_size:
+            lev2_handle_cache.popitem( last = False )
+
+    return entry
+
+######################################################################
+######################################################################
+
+
+def get_lev2_georef( fname ):
+
+    '''
+    Returns georeference of a level-2 file (read only once per file).
+
+
+    Parameters
+    ----------
+    fname : str
+        input data file name
+
+
+    Returns
+    --------
+    geo : dict
+        dict with 'lon' and 'lat' (shared and read-only)
+    '''
+
+    entry = get_lev2_handle( fname )
+
+    with entry['lock']:
+
+        if entry['geo'] is None:
+            with netcdf_lock:
+                geo = ncio.read_icon_4d_data(fname, ['lon', 'lat'], itime = None)
+
+            for v in geo.values():
+                v.flags.writeable = False
+
+            entry['geo'] = geo
+
+    return entry['geo']
+
+######################################################################
+######################################################################
+
+
+def clear_lev2_cache():
+
+    '''
+    Empties the level-2 session store (files are closed as soon as they are
+    not used anymore).
+    '''
+
+    with lev2_handle_lock:
+        lev2_handle_cache.clear()
+
+    return
+
+######################################################################
+######################################################################
+
+
+def read_data_field( fname, time, varname, region = 'full_region', use_cache = True ):
 
     '''
     Reads "level2" data for analysis and plotting.
@@ -72,6 +190,10 @@ def read_data_field( fname, time, varname, region = 'full_region' ):
     region : str, optional, default = 'full_region'
         region for which mask is input
 
+    use_cache : bool, optional, default = True
+        if True, file handle, georef and time objects are taken from the
+        level-2 session store and only the requested slice is read
+
 
     Returns 
     --------
@@ -82,24 +204,47 @@ def read_data_field( fname, time, varname, region = 'full_region' ):
 
     # read bt variables
     # dset = ncio.read_icon_4d_data(fname, [varname], itime = itime)
-    xset = xr.open_dataset(fname)
+    if use_cache:
+        entry = get_lev2_handle( fname )
+        xset = entry['xset']
+    else:
+        with netcdf_lock:
+            xset = xr.open_dataset(fname)
     
     # time is given as index
     if type( time ) == type( 10 ):
         itime = time
-        var = np.ma.masked_invalid( xset.isel(time = itime)[varname].data )
-        time_obj = ncio.read_icon_time(fname, itime = itime)
+
+        with netcdf_lock:
+            var = np.ma.masked_invalid( xset[varname].isel(time = itime).data )
+
+        if not use_cache:
+            with netcdf_lock:
+                time_obj = ncio.read_icon_time(fname, itime = itime)
+        else:
+            with entry['lock']:
+                if itime not in entry['time_obj']:
+                    with netcdf_lock:
+                        entry['time_obj'][itime] = ncio.read_icon_time(fname, itime = itime)
+                time_obj = entry['time_obj'][itime]
         
     # time is given as datetime object
     elif type ( time ) == datetime.datetime :
         tfloat = convert_time( time ) 
-        var = np.ma.masked_invalid( xset.sel(time = tfloat, method = 'nearest')[varname].data )
+
+        with netcdf_lock:
+            var = np.ma.masked_invalid( xset[varname].sel(time = tfloat, method = 'nearest').data )
         time_obj = time
         
     dset = { varname : var }
     
     # read geo-ref
-    geo = ncio.read_icon_4d_data(fname, ['lon', 'lat'], itime = None)
+    if use_cache:
+        geo = get_lev2_georef( fname )
+    else:
+        with netcdf_lock:
+            geo = ncio.read_icon_4d_data(fname, ['lon', 'lat'], itime = None)
+            xset.close()
     dset.update( geo )
 
     # also get mask
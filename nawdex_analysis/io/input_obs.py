@@ -5,11 +5,14 @@ Tools for input of observation data.
 '''
 
 import os, sys, copy
+import collections, threading
+import functools
 import numpy as np
 import scipy.ndimage
+import scipy.sparse
+import h5py
 import datetime
 
-import tropy.io_tools.hdf as hio
 import tropy.io_tools.netcdf as ncio
 import tropy.analysis_tools.grid_and_interpolation as gi
 
@@ -31,7 +34,8 @@ except:
 from ..config import SEVIRI_cutout, NWCSAF_region
 from ..config import meteosat_georef_file, gerb_like_dir
 
-from ..io.tools import lonlat2azizen
+from ..io.tools import get_viewing_geometry, get_zenith_mask, ordered_map
+from ..io.tools import cached_geometry
 
 ######################################################################
 # (1) SEVIRI BTs
@@ -68,6 +72,42 @@ def msevi_setting(t):
 ######################################################################
 
 
+def msevi_lonlat_cached( sett ):
+
+    '''
+    Returns MSG SEVIRI longitude and latitude of a region (computed once per
+    region and kept in the geometry cache, see `tools.cached_geometry`).
+
+    
+    Parameters
+    ----------
+    sett : dict
+        MSevi setting (see `msevi_setting`)
+    
+
+    Returns
+    -------
+    slon : numpy masked array
+        longitude (invalid values masked)
+
+    slat : numpy masked array
+        latitude (invalid values masked)
+    '''
+
+    def calc():
+        s = MSevi(**sett)
+        s.lonlat()
+
+        return ( np.ma.filled( s.lon, np.nan ), np.ma.filled( s.lat, np.nan ) )
+
+    lon, lat = cached_geometry( ('msevi_lonlat', sett['region']), calc )
+
+    return np.ma.masked_invalid(lon), np.ma.masked_invalid(lat)
+
+######################################################################
+######################################################################
+
+
 def read_msevi(t1, t2, dt = 60., zen_max = 75.):
 
     '''
@@ -111,14 +151,13 @@ def read_msevi(t1, t2, dt = 60., zen_max = 75.):
     # read msevi georef ----------------------------------------------
     sett = msevi_setting(t1)
 
-    s = MSevi(**sett)
-    s.lonlat()
+    # the grid only depends on the region (cache key)
+    key = ('msevi', sett['region'])
 
-    slon = np.ma.masked_invalid(s.lon)
-    slat = np.ma.masked_invalid(s.lat)
+    slon, slat = msevi_lonlat_cached( sett )
     nrow, ncol = slon.shape
 
-    azi, zen = lonlat2azizen(slon, slat)
+    azi, zen = get_viewing_geometry(slon, slat, key = key)
     zen = np.ma.masked_invalid(zen)    
     zenmask = zen > 75.
 
@@ -176,6 +215,273 @@ def read_msevi(t1, t2, dt = 60., zen_max = 75.):
     return d
 
 
+######################################################################
+######################################################################
+
+
+# standard list of MSG SEVIRI infrared channels
+msevi_chanlist = [ 'IR_039', 'WV_062', 'WV_073', 'IR_087', 
+                   'IR_097', 'IR_108', 'IR_120', 'IR_134' ]
+
+
+def read_msevi_georef( t, zen_max = 75. ):
+
+    '''
+    Reads MSG SEVIRI georeference and satellite zenith mask.
+
+    
+    Parameters
+    ----------
+    t : datetime object
+        time (used for MSevi setting)
+
+    zen_max : float, optional, default = 75.
+        maximum satellite zenith angle 
+    
+
+    Returns
+    -------
+    georef : dict of numpy arrays
+        longitude, latitude and satellite zenith angle ('lon', 'lat', 'zen')
+
+    zenmask : numpy array, bool
+        mask of pixels with zenith angle above zen_max (or invalid)
+    '''
+
+    sett = msevi_setting(t)
+
+    # the grid only depends on the region (cache key)
+    key = ('msevi', sett['region'])
+
+    slon, slat = msevi_lonlat_cached( sett )
+
+    azi, zen = get_viewing_geometry(slon, slat, key = key)
+    zen = np.ma.masked_invalid(zen)    
+    zenmask = ~get_zenith_mask( slon, slat, zen_max = zen_max, key = key )
+
+    return dict(lon = slon, lat = slat, zen = zen), zenmask
+
+######################################################################
+######################################################################
+
+
+def read_msevi_slot( t, chanlist = msevi_chanlist, dtype = np.float32 ):
+
+    '''
+    Reads MSG SEVIRI infrared BTs of one time slot.
+
+    
+    Parameters
+    ----------
+    t : datetime object
+        time of slot
+
+    chanlist : list of str, optional, default = msevi_chanlist
+        list of channel names
+
+    dtype : numpy dtype, optional, default = np.float32
+        data type of the returned BTs
+    
+
+    Returns
+    -------
+    bt : dict of numpy arrays or None
+        BT fields per channel, None if the slot could not be read (I/O 
+        errors or missing data), other errors are raised
+    '''
+
+    try:
+        s = MSevi( **msevi_setting(t) )
+        s.load( chanlist )
+        s.rad2bt()
+
+    except (IOError, OSError, KeyError) as e:
+        print(( 'Warning: MSG SEVIRI slot %s could not be read:' % t, e ))
+        return None
+
+    bt = {}
+    for chan in chanlist:
+        bt[chan] = np.ma.filled( np.ma.asarray( s.bt[chan] ).astype( dtype ), np.nan )
+
+    return bt
+
+######################################################################
+######################################################################
+
+
+def stack_msevi_slots( slots, ntime, zenmask, 
+                       chanlist = msevi_chanlist,
+                       dtype = np.float32 ):
+
+    '''
+    Fills preallocated time stacks of MSG SEVIRI BTs from a sequence of slots.
+
+    The zenith mask is shared by all channels, invalid values are masked per
+    channel (as in `read_msevi`). Slots given as None are written as NaN and 
+    are fully masked.
+
+    
+    Parameters
+    ----------
+    slots : iterable of tuples
+        sequence of (time, bt) with bt as returned by `read_msevi_slot` 
+        (dict of BT fields or None)
+
+    ntime : int
+        maximum number of slots
+
+    zenmask : numpy array, bool
+        mask of pixels with zenith angle above zen_max (or invalid)
+
+    chanlist : list of str, optional, default = msevi_chanlist
+        list of channel names
+
+    dtype : numpy dtype, optional, default = np.float32
+        data type of the BT stacks
+    
+
+    Returns
+    -------
+    d : dict
+        datastack containing 
+       
+        * list of slot times ('time')
+        * masked BTs stacked in time (i.e. 3d fields, time at axis = 0)
+        * flags of missing slots ('slot_missing', int8)
+    '''
+
+    nrow, ncol = zenmask.shape
+
+    stacks = {}
+    for chan in chanlist:
+        stacks[chan] = np.empty( (ntime, nrow, ncol), dtype = dtype )
+
+    d = dict( time = [], slot_missing = np.zeros( ntime, dtype = np.int8 ) )
+
+    for n, (t, bt) in enumerate( slots ):
+
+        d['time'].append( t )
+
+        if bt is None:
+            d['slot_missing'][n] = 1
+
+            for chan in chanlist:
+                stacks[chan][n] = np.nan
+
+        else:
+            for chan in chanlist:
+                stacks[chan][n] = bt[chan]
+
+    ntime = len( d['time'] )
+    d['slot_missing'] = d['slot_missing'][:ntime]
+
+    # invalid values (incl. missing slots) per channel plus zenith mask
+    for chan in chanlist:
+        v = stacks[chan][:ntime]
+
+        mask = np.isnan( v )
+        mask |= zenmask
+
+        d[chan] = np.ma.array( v, mask = mask, copy = False )
+
+    return d
+
+######################################################################
+######################################################################
+
+
+def read_msevi_parallel( t1, t2, dt = 60., zen_max = 75., 
+                         chanlist = msevi_chanlist,
+                         dtype = np.float32,
+                         executor = 'process', 
+                         nworkers = None ):
+
+    '''
+    Reads a time stack of MSG SEVIRI infrared channels with time slots 
+    loaded in parallel (see `read_msevi` for the serial version).
+
+    Fields are written into preallocated arrays (see `stack_msevi_slots`),
+    all channels share the zenith mask, invalid values are masked per 
+    channel. Slots that can not be read are reported in 'missing_slots' and
+    are fully masked.
+
+    
+    Parameters
+    ----------
+    t1 : datetime object
+        start time in the loop
+
+    t2 : datetime object
+        end time in the loop (included, i.e. t1 <= time <= t2)
+
+    dt : float, optional, default = 60.
+        time step in minutes
+
+    zen_max : float, optional, default = 75.
+        maximum satellite zenith angle 
+    
+        higher zenith angle are set to invalid
+
+    chanlist : list of str, optional, default = msevi_chanlist
+        list of channel names
+
+    dtype : numpy dtype, optional, default = np.float32
+        data type of the BT stacks
+
+    executor : str, optional, default = 'process'
+        type of worker pool (see `tools.ordered_map`), None reads serially
+
+    nworkers : int, optional, default = None
+        number of workers (None uses the number of CPUs)
+
+
+    Returns
+    -------
+    d : dict
+        datastack containing 
+       
+        * infrared BTs stacked in time (i.e. 3d fields, time at axis = 0)
+        * georeference
+        * meta data
+        * list of missing slots ('missing_slots')
+    '''
+
+    
+    # read msevi georef ----------------------------------------------
+    sett = msevi_setting(t1)
+
+    d, zenmask = read_msevi_georef( t1, zen_max = zen_max )
+    # ================================================================
+
+    
+    # time length ----------------------------------------------------
+    times = []
+    t = copy.copy(t1)
+    dt = datetime.timedelta(minutes = dt)
+    while t <= t2:
+        times.append( t )
+        t += dt
+    # ================================================================
+
+
+    # msevi channels (slots in parallel) -----------------------------
+    read_slot = functools.partial( read_msevi_slot, chanlist = chanlist, dtype = dtype )
+
+    bts = ordered_map( read_slot, times, executor = executor, nworkers = nworkers )
+
+    d.update( stack_msevi_slots( zip( times, bts ), len( times ), zenmask, 
+                                 chanlist = chanlist, dtype = dtype ) )
+
+    slot_missing = d.pop( 'slot_missing' )
+    d['missing_slots'] = [ t for t, m in zip( d['time'], slot_missing ) if m ]
+    # ================================================================
+
+    d['msevi_region'] = sett['region']
+    d['nwcsaf_region'] = sett['nwcsaf_region']
+
+    return d
+
+
 ######################################################################
 # (2) TOA Radiation Fluxes
 ######################################################################
@@ -225,9 +531,386 @@ def scale_radiation( rad_flux, factor = 0.25, Nan = -32767, n_repeat = 3):
 ######################################################################
 
 
+def lowres_window( region, lowres_shape, n_repeat = 3, halo = 1 ):
+
+    '''
+    Gets the low-resolution window which covers a high-resolution cutout 
+    plus a halo (needed for smoothing at the cutout edges).
+
+
+    Parameters
+    ----------
+    region : tuple of tuple of int
+        high-resolution cutout as ((row1, row2), (col1, col2))
+
+    lowres_shape : tuple of int
+        shape of the low-resolution field
+
+    n_repeat : int, optional, default = 3
+        ratio between high and low resolution
+
+    halo : int, optional, default = 1
+        number of extra low-resolution pixels on each side
+
+
+    Returns
+    -------
+    window : tuple of tuple of int
+        low-resolution window as ((row1, row2), (col1, col2)), clipped at 
+        the field boundaries
+    '''
+
+    window = []
+    for (i1, i2), n in zip( region, lowres_shape ):
+        j1 = max( i1 // n_repeat - halo, 0 )
+        j2 = min( (i2 - 1) // n_repeat + 1 + halo, n )
+
+        window.append( (j1, j2) )
+
+    return tuple( window )
+
+######################################################################
+######################################################################
+
+
+def upsampling_operator( nlow, i1, i2, n_repeat = 3 ):
+
+    '''
+    Gets sparse operator for repeating and smoothing along one axis (as in 
+    `scale_radiation`), restricted to the high-resolution rows i1 ... i2-1.
+
+    Each high-resolution pixel is a weighted mean of at most two 
+    neighboring low-resolution pixels.
+
+
+    Parameters
+    ----------
+    nlow : int
+        number of low-resolution pixels along axis
+
+    i1 : int
+        first high-resolution row (relative to the upsampled axis)
+
+    i2 : int
+        last high-resolution row + 1 (relative to the upsampled axis)
+
+    n_repeat : int, optional, default = 3
+        ratio between high and low resolution
+
+
+    Returns
+    -------
+    operator : scipy.sparse.csr_matrix
+        operator with shape (i2 - i1, nlow)
+    '''
+
+    # smoothing of repeated unit vectors gives the weights
+    weights = np.eye( nlow ).repeat( n_repeat, axis = 0 )
+    weights = scipy.ndimage.uniform_filter1d( weights, n_repeat, axis = 0 )
+
+    return scipy.sparse.csr_matrix( weights[i1:i2] )
+
+######################################################################
+######################################################################
+
+
+def scale_radiation_cutout( rad_window, window, 
+                            region = SEVIRI_cutout,
+                            factor = 0.25, 
+                            Nan = -32767, 
+                            n_repeat = 3,
+                            dtype = np.float32 ):
+
+    '''
+    Scales, repeats and smoothes a low-resolution window of radiation data 
+    and returns the high-resolution cutout only.
+
+    Scaling, repeating, smoothing and cutting are done in one pass with two
+    sparse operators (see `upsampling_operator`), i.e. the upsampled window
+    is never built. The result is the same as `scale_radiation` followed by
+    a cutout (up to floating point rounding).
+
+
+    Parameters
+    ----------
+    rad_window : numpy array, 2dim
+        radiation flux in the low-resolution window
+
+    window : tuple of tuple of int
+        low-resolution window as ((row1, row2), (col1, col2)), see 
+        `lowres_window`
+
+    region : tuple of tuple of int, optional, default = SEVIRI_cutout
+        high-resolution cutout as ((row1, row2), (col1, col2))
+
+    factor : float, optional, default = 0.25
+        scale factor
+    
+    Nan : int or float, optional, default = -32767
+        value which is set to "not a number"
+        
+    n_repeat : int, optional, default = 3
+        field is repeated along each axis "n_repeat" times
+
+    dtype : numpy dtype, optional, default = np.float32
+        data type of output, None keeps float64
+
+
+    Returns
+    -------
+    rad_scaled : numpy masked array, 2dim
+        scaled and repeated radiation flux in the cutout
+    '''
+
+    if dtype is None:
+        dtype = np.float64
+
+    # cutout relative to the upsampled window
+    (r1, r2), (c1, c2) = region
+    r1, r2 = r1 - window[0][0] * n_repeat, r2 - window[0][0] * n_repeat
+    c1, c2 = c1 - window[1][0] * n_repeat, c2 - window[1][0] * n_repeat
+
+    # scaling (invalid values are set to zero as in `scale_radiation`)
+    invalid = ( rad_window == Nan )
+    rad_low = factor * np.where( invalid, 0, rad_window ).astype( np.float64 )
+
+    # repeating and smoothing along both axes, cutout only
+    nrow, ncol = rad_window.shape
+    op_row = upsampling_operator( nrow, r1, r2, n_repeat = n_repeat )
+    op_col = upsampling_operator( ncol, c1, c2, n_repeat = n_repeat )
+
+    rad_cut = op_col.dot( op_row.dot( rad_low ).T ).T
+
+    # mask of repeated invalid values
+    irow = np.arange( r1, r2 ) // n_repeat
+    icol = np.arange( c1, c2 ) // n_repeat
+    mask = invalid[irow][:, icol]
+
+    return np.ma.array( rad_cut.astype( dtype ), mask = mask )
+
+######################################################################
+######################################################################
+
+
+# groups of GERB-like variables
+gerb_like_subpaths = { 'Thermal Flux' : 'Radiometry', 
+                       'Solar Flux' : 'Radiometry',
+                       'Incoming Solar Flux' : 'Angles',
+                       'Cloud Cover' : 'Scene Identification' }
+
+
+# bounded cache of GERB-like input fields (least recently used slots are dropped)
+gerb_like_cache = collections.OrderedDict()
+gerb_like_cache_lock = threading.Lock()
+gerb_like_cache_size = 8
+
+
+def gerb_like_filename( t, fdir = gerb_like_dir ):
+
+    '''
+    Returns name of GERB-like file of a time slot.
+
+
+    Parameters
+    ----------
+    t : datetime object
+        a time slot
+        
+    fdir : str, optional, default =  gerb_like_dir
+        file directory name
+
+
+    Returns
+    -------
+    fname : str
+        name of GERB-like hdf file
+    '''
+
+    # get time string
+    time_string = t.strftime('%Y%m%d_%H%M')
+    
+    return '%s/GL_SEV3_L20_HR_SOL_TH_%s00_ED01.hdf' % (fdir, time_string)
+
+######################################################################
+######################################################################
+
+
+def read_gerb_like_slot( fname, vnames, 
+                         region = None, 
+                         n_repeat = 3, 
+                         subpaths = None, 
+                         use_cache = True ):
+
+    '''
+    Reads a set of (unscaled) GERB-like variables of one slot.
+
+    The file is opened only once for all variables that are not in the 
+    cache yet. Fields are kept in a small LRU cache per file (and window).
+
+
+    Parameters
+    ----------
+    fname : str
+        name of GERB-like hdf file
+
+    vnames : list of str
+        variable names, e.g. 'Thermal Flux', 'Solar Flux', 
+        'Incoming Solar Flux' or 'Cloud Cover'
+
+    region : tuple of tuple of int, optional, default = None
+        high-resolution cutout as ((row1, row2), (col1, col2)), only the 
+        low-resolution window covering the cutout is read 
+        (see `lowres_window`), the full field is read if None
+
+    n_repeat : int, optional, default = 3
+        ratio between high and low resolution
+
+    subpaths : dict, optional, default = None
+        groups of variables, `gerb_like_subpaths` if None
+
+    use_cache : bool, optional, default = True
+        if the LRU cache is used
+
+
+    Returns
+    -------
+    fields : dict of numpy arrays
+        low-resolution fields (int16, read-only)
+
+    window : tuple of tuple of int or None
+        low-resolution window as ((row1, row2), (col1, col2)), None for 
+        full fields
+    '''
+
+    if subpaths is None:
+        subpaths = gerb_like_subpaths
+
+    key = ( os.path.abspath( fname ), os.stat( fname ).st_mtime, region, n_repeat )
+
+    entry = None
+    if use_cache:
+        with gerb_like_cache_lock:
+            if key in gerb_like_cache:
+                gerb_like_cache.move_to_end( key )
+                entry = gerb_like_cache[key]
+
+    if entry is None:
+        entry = dict( window = None, fields = {} )
+
+    missing = [ vname for vname in vnames if vname not in entry['fields'] ]
+
+    # read all missing variables at once
+    if missing:
+
+        fields = dict( entry['fields'] )
+        window = entry['window']
+
+        with h5py.File( fname, 'r' ) as f:
+
+            for vname in missing:
+                dset = f[subpaths[vname]][vname]
+
+                if region is None:
+                    v = dset[()]
+                else:
+                    window = lowres_window( region, dset.shape, n_repeat = n_repeat )
+                    (r1, r2), (c1, c2) = window
+
+                    v = dset[r1:r2, c1:c2]
+
+                v = v.astype( np.int16 )
+                v.flags.writeable = False
+
+                fields[vname] = v
+
+        entry = dict( window = window, fields = fields )
+
+        if use_cache:
+            with gerb_like_cache_lock:
+                gerb_like_cache[key] = entry
+                gerb_like_cache.move_to_end( key )
+
+                while len( gerb_like_cache ) > gerb_like_cache_size:
+                    gerb_like_cache.popitem( last = False )
+
+    fields = dict( [ (vname, entry['fields'][vname]) for vname in vnames ] )
+
+    return fields, entry['window']
+
+######################################################################
+######################################################################
+
+
+def clear_gerb_like_cache():
+
+    '''
+    Empties the cache of GERB-like input fields.
+    '''
+
+    with gerb_like_cache_lock:
+        gerb_like_cache.clear()
+
+    return
+
+######################################################################
+######################################################################
+
+
+def read_gerb_like_cutout( fname, vname, subpath, 
+                           region = SEVIRI_cutout, 
+                           n_repeat = 3, 
+                           **kwargs ):
+
+    '''
+    Reads the low-resolution window of a GERB-like variable which covers 
+    a cutout and returns the scaled, high-resolution cutout.
+
+
+    Parameters
+    ----------
+    fname : str
+        name of GERB-like hdf file
+
+    vname : str
+        variable name
+
+    subpath : str
+        group of variable
+
+    region : tuple of tuple of int, optional, default = SEVIRI_cutout
+        high-resolution cutout as ((row1, row2), (col1, col2))
+
+    n_repeat : int, optional, default = 3
+        ratio between high and low resolution
+
+    **kwargs :
+        keyword arguments passed to `scale_radiation_cutout`
+
+
+    Returns
+    -------
+    rad_scaled : numpy masked array, 2dim
+        scaled and repeated radiation flux in the cutout
+    '''
+
+    fields, window = read_gerb_like_slot( fname, [vname,], 
+                                          region = region, 
+                                          n_repeat = n_repeat,
+                                          subpaths = {vname : subpath} )
+
+    return scale_radiation_cutout( fields[vname], window, 
+                                   region = region, 
+                                   n_repeat = n_repeat, 
+                                   **kwargs )
+
+######################################################################
+######################################################################
+
+
 def read_radiation_fluxes(t, 
                           fdir = gerb_like_dir,
-                          do_cutout = True):
+                          do_cutout = True,
+                          fused = False):
     
     '''
     Reads and scales radiation flux data based on GERB-like SEVIRI retrievals.
@@ -243,6 +926,11 @@ def read_radiation_fluxes(t,
 
     do_cutout : bool, optional, default = True
         if SEVIRI cutout is applied
+
+    fused : bool, optional, default = False
+        if True (and do_cutout), only the low-resolution window around the 
+        cutout is read and upsampled (float32 output, see 
+        `read_gerb_like_cutout`)
         
         
     Returns
@@ -254,21 +942,30 @@ def read_radiation_fluxes(t,
         net short-wave radiation flux
     '''
     
-    # get time string
-    time_string = t.strftime('%Y%m%d_%H%M')
-    
-    # input data from hdf files
-    fname = '%s/GL_SEV3_L20_HR_SOL_TH_%s00_ED01.hdf' % (fdir, time_string)
+    # input data from hdf file
+    fname = gerb_like_filename( t, fdir = fdir )
+
+    vnames = ['Thermal Flux', 'Solar Flux', 'Incoming Solar Flux']
+
+    if fused and do_cutout:
+        fields, window = read_gerb_like_slot( fname, vnames, region = SEVIRI_cutout )
+
+        lwf = scale_radiation_cutout( fields['Thermal Flux'], window )
+        swf_up = scale_radiation_cutout( fields['Solar Flux'], window, dtype = None )
+        swf_down = scale_radiation_cutout( fields['Incoming Solar Flux'], window, dtype = None )
+
+        # difference is taken before the conversion to float32
+        swf_net = (swf_up - swf_down).astype( np.float32 )
+
+        return lwf, swf_net, swf_up.astype( np.float32 )
 
     
-    lwflux_up = hio.read_var_from_hdf(fname, 'Thermal Flux', subpath='Radiometry').astype(np.int16)
-    sfflux_up = hio.read_var_from_hdf(fname, 'Solar Flux', subpath='Radiometry').astype(np.int16)
-    sfflux_down = hio.read_var_from_hdf(fname, 'Incoming Solar Flux', subpath='Angles').astype(np.int16)
+    fields, window = read_gerb_like_slot( fname, vnames )
     
     # do the scaling
-    lwf = scale_radiation( lwflux_up )
-    swf_down = scale_radiation( sfflux_down )
-    swf_up = scale_radiation( sfflux_up )
+    lwf = scale_radiation( fields['Thermal Flux'] )
+    swf_down = scale_radiation( fields['Incoming Solar Flux'] )
+    swf_up = scale_radiation( fields['Solar Flux'] )
     swf_net = swf_up  -  swf_down
 
     if do_cutout:
@@ -282,7 +979,8 @@ def read_radiation_fluxes(t,
 def read_solar_flux(t, 
                     fluxtype = 'incoming', 
                     fdir = gerb_like_dir,
-                    do_cutout = True):
+                    do_cutout = True,
+                    fused = False):
     
     '''
     Reads and scales incoming solar radiation flux data based on GERB-like SEVIRI retrievals.
@@ -301,6 +999,11 @@ def read_solar_flux(t,
 
     do_cutout : bool, optional, default = True
         if SEVIRI cutout is applied
+
+    fused : bool, optional, default = False
+        if True (and do_cutout), only the low-resolution window around the 
+        cutout is read and upsampled (float32 output, see 
+        `read_gerb_like_cutout`)
         
         
     Returns
@@ -309,20 +1012,23 @@ def read_solar_flux(t,
         up- or downwelling short-wave radiation flux
     '''
     
-    # get time string
-    time_string = t.strftime('%Y%m%d_%H%M')
-    
-    # input data from hdf files
-    fname = '%s/GL_SEV3_L20_HR_SOL_TH_%s00_ED01.hdf' % (fdir, time_string)
+    # input data from hdf file
+    fname = gerb_like_filename( t, fdir = fdir )
 
     if fluxtype in ['incoming', 'downwelling']:
-        sfflux = hio.read_var_from_hdf(fname, 'Incoming Solar Flux', subpath='Angles').astype(np.int16)
+        vname = 'Incoming Solar Flux'
     elif fluxtype == 'upwelling':
-        sfflux = hio.read_var_from_hdf(fname, 'Solar Flux', subpath='Radiometry').astype(np.int16)
+        vname = 'Solar Flux'
+
+    if fused and do_cutout:
+        fields, window = read_gerb_like_slot( fname, [vname,], region = SEVIRI_cutout )
+        return scale_radiation_cutout( fields[vname], window )
+
+    fields, window = read_gerb_like_slot( fname, [vname,] )
 
     
     # do the scaling
-    swf = scale_radiation( sfflux )
+    swf = scale_radiation( fields[vname] )
 
     if do_cutout:
         return gi.cutout_fields(swf, SEVIRI_cutout)
@@ -334,7 +1040,8 @@ def read_solar_flux(t,
 
 def read_cc_from_fluxdata(t, 
                           fdir = gerb_like_dir,
-                          do_cutout = True):
+                          do_cutout = True,
+                          fused = False):
     
     '''
     Reads and scales cloud cover based on GERB-like SEVIRI retrievals.
@@ -350,6 +1057,11 @@ def read_cc_from_fluxdata(t,
 
     do_cutout : bool, optional, default = True
         if SEVIRI cutout is applied
+
+    fused : bool, optional, default = False
+        if True (and do_cutout), only the low-resolution window around the 
+        cutout is read and upsampled (float32 output, see 
+        `read_gerb_like_cutout`)
         
         
     Returns
@@ -358,17 +1070,17 @@ def read_cc_from_fluxdata(t,
         cloud cover field
     '''
     
-    # get time string
-    time_string = t.strftime('%Y%m%d_%H%M')
-    
-    # input data from hdf files
-    fname = '%s/GL_SEV3_L20_HR_SOL_TH_%s00_ED01.hdf' % (fdir, time_string)
+    # input data from hdf file
+    fname = gerb_like_filename( t, fdir = fdir )
 
+    if fused and do_cutout:
+        fields, window = read_gerb_like_slot( fname, ['Cloud Cover',], region = SEVIRI_cutout )
+        return scale_radiation_cutout( fields['Cloud Cover'], window, factor = 0.01 )
 
-    cc = hio.read_var_from_hdf(fname, 'Cloud Cover', subpath='Scene Identification').astype(np.int16)
+    fields, window = read_gerb_like_slot( fname, ['Cloud Cover',] )
     
     # do the scaling
-    cc_scaled = scale_radiation( cc, factor = 0.01 )
+    cc_scaled = scale_radiation( fields['Cloud Cover'], factor = 0.01 )
 
     if do_cutout:
         return gi.cutout_fields(cc_scaled, SEVIRI_cutout)
@@ -379,6 +1091,48 @@ def read_cc_from_fluxdata(t,
 ######################################################################
 ######################################################################
 
+def read_radiation_flux_slot( t, fdir = gerb_like_dir, fused = False ):
+
+    '''
+    Reads the GERB-like radiation fluxes of one time slot in the SEVIRI 
+    cutout and tolerates missing files.
+
+    
+    Parameters
+    ----------
+    t : datetime object
+        a time slot
+        
+    fdir : str, optional, default =  gerb_like_dir
+        file directory name
+
+    fused : bool, optional, default = False
+        if the cutout-first upsampling is used (see `read_radiation_fluxes`)
+
+
+    Returns
+    -------
+    rad : dict of numpy arrays or None
+        float32 fields 'lwf', 'swf_net' and 'swf_up' (masked values as NaN),
+        None if the slot could not be read
+    '''
+
+    try:
+        fluxes = read_radiation_fluxes( t, fdir = fdir, do_cutout = True, fused = fused )
+
+    except (IOError, OSError, KeyError) as e:
+        print(( 'Warning: GERB-like slot %s could not be read:' % t, e ))
+        return None
+
+    rad = {}
+    for vname, v in zip( ['lwf', 'swf_net', 'swf_up'], fluxes ):
+        rad[vname] = np.ma.filled( np.ma.asarray( v ).astype( np.float32 ), np.nan )
+
+    return rad
+
+######################################################################
+######################################################################
+
 def read_radiation_flux_tstack(date, 
                                fdir = gerb_like_dir,
                                georef_file = None,
@@ -5,19 +5,26 @@ Tools for input of simulated data.
 '''
 
 import os, sys, copy, glob
+import collections, threading
+import functools, itertools
+import warnings
 import numpy as np
 import scipy.ndimage
 import datetime
 import xarray as xr
 import pandas as pd
+import h5py
+import netCDF4
 
 import tropy.io_tools.hdf as hio
 import tropy.io_tools.netcdf as ncio
 import tropy.analysis_tools.grid_and_interpolation as gi
 
-from .tools import lonlat2azizen
+from .tools import ordered_map, convert_time, netcdf_lock
+from .tools import get_viewing_geometry, get_zenith_mask
 from . import reproj
 from ..config import simulation_dir, SEVIRI_cutout, NWCSAF_region, nawdex_regions_file
+from ..config import cache_dir
 
 ######################################################################
 # (1) Variable Vectors
@@ -71,7 +78,8 @@ def get_grid_filename( subdir ):
     Returns
     -------
     gridfile : str
-        name of the NAWDEX grid file
+        name of the NAWDEX grid file (ValueError is raised if no grid file 
+        is known for subdir)
     '''
 
 
@@ -93,6 +101,9 @@ def get_grid_filename( subdir ):
     elif '80km' in subdir:
         gridfile = '/work/bm0834/b380459/NAWDEX/grids/icon-grid_nawdex_78w40e23n80n_R80000m.nc'
 
+    else:
+        raise ValueError('no grid file known for %s' % subdir)
+
     return gridfile
 
 
@@ -138,11 +149,168 @@ def get_synsat_basename(synsat_name ):
 ######################################################################
 
 
-def read_georef( expname, mask_with_zen = True, zen_max = 75. ):
+# bounded cache of ICON georefs (least recently used entries are dropped)
+georef_cache = collections.OrderedDict()
+georef_cache_lock = threading.Lock()
+georef_cache_size = 4
+
+
+def calc_georef_entry( gridfile, zen_max = 75. ):
+
+    '''
+    Reads geo reference from grid file and calculates satellite angles 
+    and zenith angle index.
+
+    
+    Parameters
+    ----------
+    gridfile : str
+        name of ICON grid file
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle
+
+
+    Returns
+    -------
+    entry : dict of numpy arrays
+        unmasked georef (clon, clat, lon, lat, azi, zen) and 
+        index of cells with zen <= zen_max ('zen_index')
+    '''
+
+    # lon/lat input
+    geo = ncio.read_icon_4d_data(gridfile, ['clon', 'clat'], itime = None)
+
+    # calculate zenith angle
+    clon, clat = geo['clon'], geo['clat']
+    clon, clat = np.rad2deg( clon ), np.rad2deg( clat )
+
+    geo['lon'], geo['lat'] = clon, clat
+
+    # satellite angles are computed once per grid
+    gkey = ( os.path.abspath( gridfile ), os.stat( gridfile ).st_mtime )
+    geo['azi'], geo['zen'] = get_viewing_geometry( clon, clat, key = gkey )
+
+    # index of cells within zenith angle limit
+    geo['zen_index'] = np.flatnonzero( get_zenith_mask( clon, clat, zen_max = zen_max, key = gkey ) )
+
+    return geo
+
+######################################################################
+######################################################################
+
+
+def get_georef_entry( gridfile, zen_max = 75., use_cache = True, sidecar = False ):
+
+    '''
+    Returns cached georef entry of an ICON grid (see `calc_georef_entry`).
+
+    
+    Parameters
+    ----------
+    gridfile : str
+        name of ICON grid file
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle
+
+    use_cache : bool, optional, default = True
+        switch if in-memory cache is used
+
+    sidecar : bool, optional, default = False
+        switch if georef is also stored as (memory-mapped) sidecar file 
+        under cache_dir
+
+
+    Returns
+    -------
+    entry : dict of numpy arrays
+        unmasked and masked georef and zenith angle index,
+        keys 'full', 'masked' and 'zen_index' (all arrays read-only)
+    '''
+
+    fstat = os.stat( gridfile )
+    key = ( os.path.abspath( gridfile ), fstat.st_mtime, float( zen_max ) )
+
+    if use_cache:
+        with georef_cache_lock:
+            if key in georef_cache:
+                georef_cache.move_to_end( key )
+                return georef_cache[key]
+
+
+    # read or calculate georef .......................................
+    if sidecar:
+        ckey = reproj.reproj_cache_key( gridfile, region = None, zen_max = zen_max, 
+                                        kind = 'georef', zenmask = 'angle' )
+        cdir = '%s/georef/%s' % (cache_dir, ckey)
+
+        if not os.path.isdir( cdir ):
+            try:
+                reproj.save_array_cache( cdir, calc_georef_entry( gridfile, zen_max = zen_max ) )
+            except (IOError, OSError) as err:
+                warnings.warn( 'georef sidecar could not be written: %s' % str(err) )
+
+        if os.path.isdir( cdir ):
+            geo = reproj.load_array_cache( cdir )
+        else:
+            geo = calc_georef_entry( gridfile, zen_max = zen_max )
+
+    else:
+        geo = calc_georef_entry( gridfile, zen_max = zen_max )
+
+
+    # prepare entry ..................................................
+    zen_index = geo.pop( 'zen_index' )
+
+    entry = dict( full = geo,
+                  masked = dict( [ (k, geo[k][zen_index]) for k in geo ] ),
+                  zen_index = zen_index )
+
+    for g in [entry['full'], entry['masked'], entry]:
+        for k in g:
+            if isinstance( g[k], np.ndarray ):
+                g[k].flags.writeable = False
+
+
+    if use_cache:
+        with georef_cache_lock:
+            georef_cache[key] = entry
+            
+            while len( georef_cache ) > georef_cache_size:
+                georef_cache.popitem( last = False )
+
+    return entry
+
+######################################################################
+######################################################################
+
+
+def clear_georef_cache():
+
+    '''
+    Empties the georef cache.
+    '''
+
+    with georef_cache_lock:
+        georef_cache.clear()
+
+    return
+
+######################################################################
+######################################################################
+
+
+def read_georef( expname, mask_with_zen = True, zen_max = 75., 
+                 use_cache = True, 
+                 sidecar = False ):
 
     '''
     Reads geo reference of simulation.
 
+    Georefs are kept in a bounded in-memory cache (see `get_georef_entry`), 
+    the returned arrays are shared and read-only.
+
     
     Parameters
     ----------
@@ -156,6 +324,12 @@ def read_georef( expname, mask_with_zen = True, zen_max = 75. ):
     zen_max : float, optional, default = 75
         maximum in satellite zenith angle (if mask_with_zen = True)
 
+    use_cache : bool, optional, default = True
+        switch if in-memory cache is used
+
+    sidecar : bool, optional, default = False
+        switch if georef is also stored as sidecar file under cache_dir
+
 
     Returns
     -------
@@ -170,25 +344,51 @@ def read_georef( expname, mask_with_zen = True, zen_max = 75. ):
         gridfile = get_grid_filename( expname )
 
 
-    # lon/lat input
-    geo = ncio.read_icon_4d_data(gridfile, ['clon', 'clat'], itime = None)
+    entry = get_georef_entry( gridfile, zen_max = zen_max, 
+                              use_cache = use_cache, 
+                              sidecar = sidecar )
 
-    # calculate zenith angle
-    clon, clat = geo['clon'], geo['clat']
-    clon, clat = np.rad2deg( clon ), np.rad2deg( clat )
+    # do masking with satellite zenith angle
+    if mask_with_zen:
+        geo = entry['masked']
+    else:
+        geo = entry['full']
 
-    geo['lon'], geo['lat'] = clon, clat
-    geo['azi'], geo['zen'] = lonlat2azizen(clon, clat)
+    return dict( geo )
+
+######################################################################
+######################################################################
+
+def get_zen_index( expname, zen_max = 75. ):
     
+    '''
+    Returns the (precomputed) index of ICON cells within the satellite 
+    zenith angle limit.
 
-    # do masking with satellite zenith angle
-    if mask_with_zen:
-        mask = (geo['zen'] <= zen_max)
+    
+    Parameters
+    ----------
+    expname : str
+        this is the experiment name which should be equal to the subdirectory
+        it is allowed to also pass the georef filename directly through this agrument
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle
 
-        for vname in list(geo.keys()):
-            geo[vname] = geo[vname][mask]
 
-    return geo
+    Returns
+    -------
+    zen_index : numpy array
+        index of cells where satellite zenith angle condition is valid
+    '''
+
+    # get gridfile name
+    if os.path.isfile( expname ):
+        gridfile = expname
+    else:
+        gridfile = get_grid_filename( expname )
+
+    return get_georef_entry( gridfile, zen_max = zen_max )['zen_index']
 
 ######################################################################
 ######################################################################
@@ -207,6 +407,7 @@ def get_zen_mask(expname, geo = {}, mask_with_zen = False, zen_max = 75.):
 
     geo : dict, optional, default ={}
         contains georef information if this is available in advance
+        (a given zenith angle 'zen' is used directly)
 
     mask_with_zen : bool, optional, default = True
         if zen mask should be applied
@@ -218,13 +419,18 @@ def get_zen_mask(expname, geo = {}, mask_with_zen = False, zen_max = 75.):
         mask where satellite zenith angle condition is valid
     '''
 
+    # use given zenith angle
+    if 'zen' in geo:
+        return (geo['zen'] <= zen_max)
+
+
     # get georef if needed
     if geo == {}:
         geo = read_georef( expname, mask_with_zen = mask_with_zen, zen_max = zen_max )
     
     
-    # calculate mask
-    mask = (geo['zen'] <= zen_max)
+    # calculate mask (float64 angles, cached per grid)
+    mask = get_zenith_mask( geo['lon'], geo['lat'], zen_max = zen_max )
     
     
     return mask
@@ -232,7 +438,115 @@ def get_zen_mask(expname, geo = {}, mask_with_zen = False, zen_max = 75.):
 ######################################################################
 ######################################################################
 
-def read_synsat_vector( fname, bt_generation_mode = 'mcfarq_rescale_noccthresh' ):
+def read_hdf_cells( dset, cells = None ):
+
+    '''
+    Reads (a subset of) cells from a HDF5 vector dataset using hyperslabs.
+
+
+    Parameters
+    ----------
+    dset : h5py Dataset
+        vector dataset, possibly with additional singleton dimensions
+
+    cells : slice or numpy array, optional, default = None
+        selection of cells, either as slice or as (sorted) index array, 
+        for index arrays the bounding hyperslab is read and subsampled
+        
+
+    Returns
+    -------
+    v : numpy array
+        selected cells (singleton dimensions squeezed)
+    '''
+
+    if cells is None:
+        return dset[()].squeeze()
+
+
+    # cell axis is the longest axis
+    cell_axis = int( np.argmax( dset.shape ) )
+    
+    hyperslab = [slice( None ), ] * len( dset.shape )
+
+
+    if isinstance( cells, slice ):
+        hyperslab[cell_axis] = cells
+        v = dset[ tuple( hyperslab ) ]
+
+    else:
+        cells = np.asarray( cells )
+        
+        if len( cells ) == 0:
+            hyperslab[cell_axis] = slice( 0, 0 )
+            return dset[ tuple( hyperslab ) ].squeeze()
+
+        c1, c2 = cells.min(), cells.max() + 1
+
+        hyperslab[cell_axis] = slice( c1, c2 )
+        v = np.take( dset[ tuple( hyperslab ) ], cells - c1, axis = cell_axis )
+
+    return v.squeeze()
+
+######################################################################
+######################################################################
+
+
+def read_synsat_channels( fname, 
+                          bt_generation_mode = 'mcfarq_rescale_noccthresh',
+                          channels = None,
+                          cells = None ):
+    
+    '''
+    Reads Synsat BT vectors of one generation mode (and optionally only a 
+    channel and cell subset) from synsat file.
+
+
+    Parameters
+    ----------
+    fname : str
+        name of synsat file (should be hdf5 file generated by Synsat forward operator)
+
+    bt_generation_mode : str, optional, default =  'mcfarq_rescale_noccthresh'
+        mode used for Synsat generation (several options for Synsat are possible)
+
+    channels : list of str, optional, default = None
+        channel subset as output names, e.g. ['bt108', 'bt120'], 
+        None reads all channels
+
+    cells : slice or numpy array, optional, default = None
+        cell subset (see `read_hdf_cells`), None reads all cells
+
+
+    Returns
+    -------
+    outset : dict of numpy arrays
+        set of synsat BT vectors (in K)
+    '''
+
+    outset = {}
+
+    with h5py.File( fname, 'r' ) as f:
+
+        bts = f[ bt_generation_mode ]
+
+        for k in bts:
+            btname = 'bt%s' % k[3:]
+
+            if channels is not None and btname not in channels:
+                continue
+
+            # Scaling: BTs are saved as 100th of a Kelvin.
+            outset[btname] = read_hdf_cells( bts[k], cells = cells ) / 100.
+
+    return outset
+
+######################################################################
+######################################################################
+
+def read_synsat_vector( fname, bt_generation_mode = 'mcfarq_rescale_noccthresh',
+                        channels = None,
+                        cells = None ):
     
     '''
     Input of Synsat BT vector (given at original ICON grid).
@@ -246,6 +560,13 @@ def read_synsat_vector( fname, bt_generation_mode = 'mcfarq_rescale_noccthresh'
     bt_generation_mode : str, optional, default =  'mcfarq_rescale_noccthresh'
         mode used for Synsat generation (several options for Synsat are possible)
 
+    channels : list of str, optional, default = None
+        channel subset as output names, e.g. ['bt108', 'bt120'], 
+        None reads all channels
+
+    cells : slice or numpy array, optional, default = None
+        subset of (zenith-masked) cells, None reads all cells
+
 
     Returns
     -------
@@ -254,25 +575,23 @@ def read_synsat_vector( fname, bt_generation_mode = 'mcfarq_rescale_noccthresh'
     '''
 
 
-    # read brightness temperatures
-    # =============================
+    # read brightness temperatures (only requested mode and channels)
+    # ================================================================
     print(('... read data from ', fname))
-    dset = hio.read_dict_from_hdf(fname)
-    bts = dset[ bt_generation_mode ]
-
-
-    # Scaling: BTs are saved as 100th of a Kelvin.
-    # ========================================
-    outset = {}
-    for k in bts:
-        btname = 'bt%s' % k[3:]
-        outset[btname]  = bts[k].squeeze() / 100.
+    outset = read_synsat_channels( fname, 
+                                   bt_generation_mode = bt_generation_mode,
+                                   channels = channels,
+                                   cells = cells )
         
         
     # read georeference
     # ==================
     subdir =  subdir_from_fname( fname )
     geo = read_georef( subdir )
+
+    if cells is not None:
+        for k in list( geo.keys() ):
+            geo[k] = geo[k][cells]
     
     outset.update( geo )
 
@@ -324,9 +643,9 @@ def read_iconvar_vector( fname, vlist ):
     geo = read_georef( subdir, mask_with_zen = False )
     
 
-    # get zenith angle mask
-    # =====================
-    mask =  get_zen_mask( subdir, geo = geo )
+    # get zenith angle mask (as precomputed index)
+    # ============================================
+    mask =  get_zen_index( subdir )
 
 
     # prepare dict output
@@ -424,140 +743,1167 @@ def read_icon_rad_vector( fname, map_varnames = True, use_clear = False ):
 ######################################################################
 ######################################################################
 
-def read_time( fname ):
+def read_time_netcdf( infile ):
 
     '''
-    Reads time object from netcdf file. Applies filename mapping if synsat
-    file is used.
+    Reads first time of netcdf file using netCDF4 (only the time variable 
+    is accessed).
 
 
     Parameters
     ----------
-    fname : str
-        name of file
+    infile : str
+        name of netcdf file
 
 
     Returns
     -------
     time : datetime object
         time
- 
     '''
 
+    with netCDF4.Dataset( infile, 'r' ) as f:
+        tvar = f.variables['time']
+        tvar.set_auto_maskandscale( False )
 
-    # check if file is synsat
-    if 'synsat_' in os.path.basename( fname ):
-        infile =  get_synsat_basename( fname )
-    else:
-        infile = fname
+        tval = tvar[0]
+        units = tvar.units
+        calendar = getattr( tvar, 'calendar', 'standard' )
 
 
-    # input time and convert to datetime object
-    # (a bit complicated using xarray and pandas...)
-    xset = xr.open_dataset( infile )
-    time =  pd.to_datetime(  xset['time'].data[0] ).to_pydatetime()
-    xset.close()
+    # ICON absolute time axis
+    if units.startswith( 'day as %Y%m%d' ):
+        return convert_time( float( tval ) )
 
+    t = netCDF4.num2date( tval, units, calendar )
+    time = datetime.datetime( t.year, t.month, t.day, 
+                              t.hour, t.minute, t.second, t.microsecond )
 
     return time
 
 ######################################################################
 ######################################################################
 
-    
 
+def read_time( fname, fast = True, use_catalog = True ):
 
-def read_generic_sim_data_flist( flist, 
-                                 input_param,
-                                 interpolation2msevi = True ):
-    
     '''
-    Reads ICON field vectors from filelist as time stack.
+    Reads time object from netcdf file. Applies filename mapping if synsat
+    file is used.
 
 
     Parameters
     ----------
-    flist : list of str
-        filename  list of ICON file (should be netcdf file)
-
-    input_param : dict
-        set of input parameters incl. function for data reading and kwargs
-        mandatory keys: 'reader_function', 'reader_kwargs', 'variable_list'
+    fname : str
+        name of file
 
-    interpolation2msevi : bool, optional, default = True
-        switch if output should be interpolated to MSG grid
+    fast : bool, optional, default = True
+        switch if only the time variable is read via netCDF4 
+        (otherwise the full file is opened with xarray)
 
+    use_catalog : bool, optional, default = True
+        switch if time is taken from time catalog (if the file has 
+        been catalogued before and is unchanged, see `update_time_catalog`)
 
 
     Returns
     -------
-    dataset : dict of numpy arrays
-        set of synsat and georef vectors
+    time : datetime object
+        time
+ 
     '''
 
+    # lookup in time catalog
+    if use_catalog:
+        time = lookup_time_catalog( fname )
 
+        if time is not None:
+            return time
 
-    # check input paramaters -----------------------------------------
-    mandatory_input_keys = ['reader_function',
-                             'reader_kwargs',
-                             'variable_list']
-
-    for k in mandatory_input_keys:
-        if not k in list(input_param.keys()):
-            raise ValueError('%s should be defined in input_param' % k)
-    # ================================================================
 
+    # check if file is synsat
+    if 'synsat_' in os.path.basename( fname ):
+        infile =  get_synsat_basename( fname )
+    else:
+        infile = fname
 
 
-    # get input properties
-    reader_function = input_param.get('reader_function', None)
-    reader_kwargs   = input_param.get('reader_kwargs', None)
-    variable_list   = input_param.get('variable_list', None)
-    reprojection_kwargs = input_param.get('reprojection_kwargs', {} )
+    # file access is serialized between threads (see `tools.netcdf_lock`)
+    with netcdf_lock:
 
+        # fast path
+        if fast:
+            try:
+                return read_time_netcdf( infile )
+            except (KeyError, AttributeError, ValueError, TypeError):
+                pass
 
-    # init data set
-    dataset = dict( time = [] )
 
+        # input time and convert to datetime object
+        # (a bit complicated using xarray and pandas...)
+        xset = xr.open_dataset( infile )
+        time =  pd.to_datetime(  xset['time'].data[0] ).to_pydatetime()
+        xset.close()
 
-    # loop over file list
-    flist = sorted( flist )
-    for ifile, fname in enumerate( flist ):
-        
-        # input radiation vector
-        # din = read_icon_rad_vector(fname, use_clear = use_clear)
-        din = reader_function(fname, **reader_kwargs)
 
-        # do intrepolation to MSG grid
-        if interpolation2msevi:
+    return time
 
-            # get reprojection parameters
-            if ifile == 0:
-                ind = reproj.get_vector2msevi_index( din, region = SEVIRI_cutout )
-                rparam = reproj. get_vector2msevi_rparam( din, region = SEVIRI_cutout )
+######################################################################
+######################################################################
 
 
-            # interpolate partial dataset
-            dpart = {}
-            for k in variable_list:
-                dpart[k] = din[k]
+# catalog of file times per directory, entries are validated by 
+# (modification time, size) of each file
+time_catalog = {}
+time_catalog_lock = threading.Lock()
 
-            dset_inter = reproj.combined_reprojection( dpart, ind, rparam, 
-                                                                          **reprojection_kwargs )
-            
 
-            # get also new georef
-            geo = reproj.msevi_lonlat(return_azi_zen = True, region = SEVIRI_cutout)
-            dset_inter.update( geo )
+def file_stamp( fname ):
 
-            # and rewrite final dataset
-            dset = dset_inter
+    '''
+    Returns modification time and size of a file (used to validate catalog
+    entries, files rewritten in place do not change their directory).
 
 
-        else:
-            dset = din
+    Parameters
+    ----------
+    fname : str
+        name of file
+
+
+    Returns
+    -------
+    stamp : tuple or None
+        (mtime, size), None if the file does not exist
+    '''
+
+    try:
+        st = os.stat( fname )
+    except OSError:
+        return None
+
+    return ( st.st_mtime, st.st_size )
+
+######################################################################
+######################################################################
+
+
+def lookup_time_catalog( fname ):
+
+    '''
+    Looks up file time in time catalog.
+
+
+    Parameters
+    ----------
+    fname : str
+        name of file
+
+
+    Returns
+    -------
+    time : datetime object or None
+        time, None if file is not catalogued or has changed since
+    '''
+
+    fname = os.path.abspath( fname )
+    fdir = os.path.dirname( fname )
+
+    with time_catalog_lock:
+        entry = time_catalog.get( fdir, {} ).get( fname, None )
+
+    if entry is None:
+        return None
+
+    stamp, time = entry
+
+    if stamp is None or stamp != file_stamp( fname ):
+        return None
+
+    return time
+
+######################################################################
+######################################################################
+
+
+def update_time_catalog( flist, nworkers = 8, executor = 'process' ):
+
+    '''
+    Adds times of files to the per-directory time catalog. Times of new and
+    modified files (checked by modification time and size) are read in 
+    parallel.
+
+
+    Parameters
+    ----------
+    flist : list of str
+        list of (netcdf or synsat) files
+
+    nworkers : int, optional, default = 8
+        number of workers used for reading
+
+    executor : str, optional, default = 'process'
+        type of worker pool (see `tools.ordered_map`), processes are used
+        by default because netcdf/hdf5 libraries are not thread-safe
+
+
+    Returns
+    -------
+    times : dict
+        mapping of (absolute) filenames to times
+    '''
+
+    flist = [ os.path.abspath( fname ) for fname in flist ]
+    stamps = dict( [ (fname, file_stamp( fname )) for fname in flist ] )
+
+    # check for files that are missing in the catalog (or have changed)
+    missing = []
+    result = {}
+
+    with time_catalog_lock:
+        for fname in flist:
+            entry = time_catalog.get( os.path.dirname( fname ), {} ).get( fname, None )
+
+            if entry is None or entry[0] is None or entry[0] != stamps[fname]:
+                missing += [fname,]
+            else:
+                result[fname] = entry[1]
+
+
+    # read times in parallel
+    read_time_nocat = functools.partial( read_time, use_catalog = False )
+    times = ordered_map( read_time_nocat, missing, 
+                         executor = executor, nworkers = nworkers )
+    
+    with time_catalog_lock:
+        for fname, time in zip( missing, times ):
+            time_catalog.setdefault( os.path.dirname( fname ), {} )[fname] = ( stamps[fname], time )
+            result[fname] = time
+
+    return dict( [ (fname, result[fname]) for fname in flist ] )
+
+######################################################################
+######################################################################
+
+
+def get_time_catalog( fdir, pattern = '*.nc', nworkers = 8 ):
+
+    '''
+    Returns time catalog of a simulation directory.
+
+
+    Parameters
+    ----------
+    fdir : str
+        name of simulation directory
+
+    pattern : str, optional, default = '*.nc'
+        glob pattern for the files in fdir
+
+    nworkers : int, optional, default = 8
+        number of worker processes used for reading
+
+
+    Returns
+    -------
+    times : dict
+        mapping of (absolute) filenames to times
+    '''
+
+    flist = glob.glob( '%s/%s' % (fdir, pattern) )
+
+    return update_time_catalog( flist, nworkers = nworkers )
+
+######################################################################
+######################################################################
+
+
+def select_files_by_time( flist, t1 = None, t2 = None, nworkers = 8 ):
+
+    '''
+    Sorts files by time and selects a time window (using the time catalog).
+
+
+    Parameters
+    ----------
+    flist : list of str
+        list of (netcdf or synsat) files
+
+    t1 : datetime object, optional, default = None
+        start of time window (inclusive), None means no limit
+
+    t2 : datetime object, optional, default = None
+        end of time window (inclusive), None means no limit
+
+    nworkers : int, optional, default = 8
+        number of worker processes used for reading
+
+
+    Returns
+    -------
+    flist_selected : list of str
+        files within time window, sorted by time
+    '''
+
+    times = update_time_catalog( flist, nworkers = nworkers )
+
+    flist_selected = []
+    for fname in sorted( flist, key = lambda f: (times[os.path.abspath( f )], f) ):
+
+        time = times[os.path.abspath( fname )]
+
+        if t1 is not None and time < t1:
+            continue
+
+        if t2 is not None and time > t2:
+            continue
+
+        flist_selected += [fname,]
+
+    return flist_selected
+
+######################################################################
+######################################################################
+
+# catalog of simulation files per experiment directory
+sim_file_catalog = {}
+sim_file_catalog_lock = threading.Lock()
+
+
+def parse_sim_filename( fname ):
+
+    '''
+    Splits name of an ICON output (or synsat) file into its parts.
+
+    Expected names are "<expname>_<initdate>_<stream>_DOM<nn>_<level>_<step>.nc"
+    for ICON output and "synsat_<simbase>_<suffix1>_<suffix2>.h5" for synsat 
+    files (see `get_synsat_basename`).
+
+
+    Parameters
+    ----------
+    fname : str
+        name of file
+
+
+    Returns
+    -------
+    entry : dict or None
+        dict with 'expname', 'initdate', 'stream' and 'step', None if name
+        does not match
+    '''
+
+    base, ext = os.path.splitext( os.path.basename( fname ) )
+
+    if base.startswith( 'synsat_' ):
+        base = '_'.join( base.split('_')[1:-2] )
+        stream = 'synsat'
+    else:
+        stream = None
+
+    parts = base.split('_')
+
+    # search domain token which follows the stream name
+    idom = [ i for i, p in enumerate( parts ) if p.startswith('DOM') ]
+
+    if len( idom ) == 0 or not parts[-1].isdigit():
+        return None
+
+    idom = idom[-1]
+
+    # search initialization date token (YYYYMMDDHH)
+    iinit = [ i for i, p in enumerate( parts[:idom] ) if p.isdigit() and len( p ) == 10 ]
+
+    if len( iinit ) == 0:
+        return None
+
+    iinit = iinit[-1]
+
+    if stream is None:
+        stream = '_'.join( parts[iinit + 1:idom] )
+
+    entry = dict( expname = '_'.join( parts[:iinit] ),
+                  initdate = parts[iinit],
+                  stream = stream,
+                  step = int( parts[-1] ) )
+
+    return entry
+
+######################################################################
+######################################################################
+
+
+def get_sim_file_catalog( expname, sim_dir = None, pattern = ('.nc', '.h5') ):
+
+    '''
+    Returns catalog of files in an experiment directory.
+
+    The directory is listed on each call, only new files and files whose 
+    modification time or size has changed are parsed again.
+
+
+    Parameters
+    ----------
+    expname : str
+        name of the simulation experiment, e.g. expname = 'nawdexnwp-20km-mis-0001'
+
+    sim_dir : str, optional, default = None
+        base directory of simulations, `simulation_dir` from config if None
+
+    pattern : tuple of str, optional, default = ('.nc', '.h5')
+        file extensions that are catalogued
+
+
+    Returns
+    -------
+    catalog : dict
+        catalog with 'files' (mapping of filenames to entries, see 
+        `parse_sim_filename`) and 'index' (mapping of (stream, step) to 
+        filename)
+    '''
+
+    if sim_dir is None:
+        sim_dir = simulation_dir
+
+    fdir = os.path.abspath( '%s/%s' % (sim_dir, expname) )
+
+    # list directory and stamp files (files rewritten in place do not
+    # change the directory modification time)
+    stamps = {}
+    for f in os.listdir( fdir ):
+
+        if not f.endswith( pattern ):
+            continue
+
+        fname = '%s/%s' % (fdir, f)
+        stamps[fname] = file_stamp( fname )
+
+    with sim_file_catalog_lock:
+
+        catalog = sim_file_catalog.get( fdir, None )
+
+        if catalog is not None and catalog['stamps'] == stamps:
+            return catalog
+
+        # entries of unchanged files are kept
+        files_old = {} if catalog is None else catalog['files']
+        stamps_old = {} if catalog is None else catalog['stamps']
+
+        files = {}
+        for fname in stamps:
+
+            if fname in files_old and stamps_old.get( fname, None ) == stamps[fname]:
+                files[fname] = files_old[fname]
+            else:
+                entry = parse_sim_filename( fname )
+
+                if entry is not None:
+                    files[fname] = entry
+
+        index = {}
+        for fname in sorted( files ):
+            entry = files[fname]
+            index[(entry['stream'], entry['step'])] = fname
+
+        catalog = dict( stamps = stamps, files = files, index = index )
+        sim_file_catalog[fdir] = catalog
+
+    return catalog
+
+######################################################################
+######################################################################
+
+
+def lookup_sim_file( expname, stream, step = None, time = None, sim_dir = None ):
+
+    '''
+    Looks up a simulation file in the file catalog, either by output step 
+    or by valid time.
+
+
+    Parameters
+    ----------
+    expname : str
+        name of the simulation experiment, e.g. expname = 'nawdexnwp-20km-mis-0001'
+
+    stream : str
+        name of output stream, e.g. '2drad_30min' or 'synsat'
+
+    step : int, optional, default = None
+        output step (number at the end of the filename)
+
+    time : datetime object, optional, default = None
+        valid time, used if step is None (file times are read once and 
+        kept in the time catalog)
+
+    sim_dir : str, optional, default = None
+        base directory of simulations, `simulation_dir` from config if None
+
+
+    Returns
+    -------
+    fname : str or None
+        name of file, None if not available
+    '''
+
+    catalog = get_sim_file_catalog( expname, sim_dir = sim_dir )
+
+    if step is not None:
+        return catalog['index'].get( (stream, step), None )
+
+    # time lookup
+    flist = sorted( [ fname for fname, entry in catalog['files'].items() 
+                      if entry['stream'] == stream ] )
+
+    # times are validated in the time catalog (rewritten files are re-read)
+    times = update_time_catalog( flist )
+
+    time_index = dict( [ (times[fname], fname) for fname in flist ] )
+
+    return time_index.get( time, None )
+
+######################################################################
+######################################################################
+
+
+def clear_sim_file_catalog():
+
+    '''
+    Empties the simulation file catalog.
+    '''
+
+    with sim_file_catalog_lock:
+        sim_file_catalog.clear()
+
+    return
+
+######################################################################
+######################################################################
+
+
+def get_vector2msevi_reproj( fname, vgeo, 
+                             region = SEVIRI_cutout,
+                             zen_max = 75.,
+                             use_cache = True,
+                             index_kwargs = {} ):
+
+    '''
+    Gets nn index and reprojection parameters for the conversion of ICON
+    output vectors into the Msevi grid.
+
+    Index and parameters only depend on the ICON grid. Hence, they are taken
+    from a persistent cache (keyed by grid file, vector georef, region, zenith
+    limit and code version) if possible.
+
+
+    Parameters
+    ----------
+    fname : str
+        name of ICON (or synsat) file, used to determine the grid file
+
+    vgeo : dict of numpy arrays
+        set of fields containing vector geo-reference
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle used for ICON vectors
+
+    use_cache : bool, optional, default = True
+        switch if persistent cache is used
+
+    index_kwargs : dict, optional, default = {}
+        keywords passed to `reproj.get_vector2msevi_index` 
+        (e.g. method = 'kdtree', max_distance)
+
+
+    Returns
+    --------
+    ind : numpy array
+        index for nn interpolation
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+    '''
+
+    # get gridfile name
+    try:
+        gridfile = get_grid_filename( subdir_from_fname( fname ) )
+    except ValueError:
+        gridfile = None
+
+    if use_cache and gridfile is not None and os.path.isfile( gridfile ):
+        return reproj.get_cached_vector2msevi_reproj( vgeo, gridfile, 
+                                                      region = region,
+                                                      zen_max = zen_max,
+                                                      index_kwargs = index_kwargs )
+    
+    ind = reproj.get_vector2msevi_index( vgeo, region = region, **index_kwargs )
+    rparam = reproj.get_vector2msevi_rparam( vgeo, region = region )
+
+    return ind, rparam
+
+######################################################################
+######################################################################
+
+    
+
+
+def read_grid_vertices( expname, mask_with_zen = True, zen_max = 75. ):
+
+    '''
+    Reads triangle vertices of ICON grid.
+
+    
+    Parameters
+    ----------
+    expname : str
+        this is the experiment name which should be equal to the subdirectory
+        it is allowed to also pass the georef filename directly through this agrument
+
+    mask_with_zen : bool, optional, default = True
+        if zen mask should be applied (based on cell centers as in `read_georef`)
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle (if mask_with_zen = True)
+
+
+    Returns
+    -------
+    vertex_lon : numpy array, 2dim
+        longitudes of triangle vertices with shape (ncell, 3)
+
+    vertex_lat : numpy array, 2dim
+        latitudes of triangle vertices with shape (ncell, 3)
+    '''
+
+    # get gridfile name
+    if os.path.isfile( expname ):
+        gridfile = expname
+    else:
+        gridfile = get_grid_filename( expname )
+
+
+    # lon/lat input
+    vlist = ['clon', 'clat', 'clon_vertices', 'clat_vertices']
+    geo = ncio.read_icon_4d_data(gridfile, vlist, itime = None)
+
+    vertex_lon = np.rad2deg( geo['clon_vertices'] )
+    vertex_lat = np.rad2deg( geo['clat_vertices'] )
+
+
+    # do masking with satellite zenith angle
+    if mask_with_zen:
+        clon, clat = np.rad2deg( geo['clon'] ), np.rad2deg( geo['clat'] )
+
+        gkey = ( os.path.abspath( gridfile ), os.stat( gridfile ).st_mtime )
+        mask = get_zenith_mask( clon, clat, zen_max = zen_max, key = gkey )
+
+        vertex_lon = vertex_lon[mask]
+        vertex_lat = vertex_lat[mask]
+
+    return vertex_lon, vertex_lat
+
+######################################################################
+######################################################################
+
+def get_conservative_reproj_operator( fname, 
+                                      region = SEVIRI_cutout,
+                                      zen_max = 75.,
+                                      use_cache = True ):
+
+    '''
+    Gets conservative remapping operator for the conversion of ICON output 
+    vectors into the Msevi grid.
+
+    Weights are calculated once per grid from the triangle vertices in the
+    grid file and stored in a persistent cache.
+
+
+    Parameters
+    ----------
+    fname : str
+        name of ICON (or synsat) file, used to determine the grid file
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle used for ICON vectors
+
+    use_cache : bool, optional, default = True
+        switch if persistent cache is used
+
+
+    Returns
+    --------
+    roperator : dict
+        reprojection operator (see `reproj.get_reproj_operator`)
+    '''
+
+    gridfile = get_grid_filename( subdir_from_fname( fname ) )
+
+    key = reproj.reproj_cache_key( gridfile, region = region, zen_max = zen_max, 
+                                   method = 'conservative', zenmask = 'angle' )
+    cdir = '%s/reproj/%s' % (cache_dir, key)
+
+    if use_cache and os.path.isdir( cdir ):
+        return reproj.load_operator_cache( cdir )
+
+
+    # calculate weights
+    vertex_lon, vertex_lat = read_grid_vertices( gridfile, zen_max = zen_max )
+    roperator = reproj.get_conservative_operator( vertex_lon, vertex_lat, region = region )
+
+    if use_cache:
+        try:
+            reproj.save_operator_cache( cdir, roperator )
+        except (IOError, OSError) as err:
+            warnings.warn( 'reprojection cache could not be written: %s' % str(err) )
+
+    return roperator
+
+######################################################################
+######################################################################
+
+def reproj_vector2msevi( din, variable_list, ind, rparam, 
+                         reprojection_kwargs = {}, 
+                         add_georef = True ):
+
+    '''
+    Reprojects a set of ICON field vectors onto the Msevi grid and adds 
+    the Msevi georef.
+
+
+    Parameters
+    ----------
+    din : dict of numpy arrays
+        set of ICON field vectors
+
+    variable_list : list of str
+        list of variables that are reprojected
+
+    ind : numpy array
+        index for nn interpolation
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+
+    reprojection_kwargs : dict, optional, default = {}
+        keywords passed to `reproj.combined_reprojection`
+
+    add_georef : bool, optional, default = True
+        switch if Msevi georef is added
+
+
+    Returns
+    --------
+    dset : dict of numpy arrays
+        set of reprojected fields incl. georef
+    '''
+
+    # interpolate partial dataset
+    dpart = {}
+    for k in variable_list:
+        dpart[k] = din[k]
+
+    dset_inter = reproj.combined_reprojection( dpart, ind, rparam, 
+                                               **reprojection_kwargs )
             
 
+    # get also new georef
+    if add_georef:
+        geo = reproj.msevi_lonlat(return_azi_zen = True, region = SEVIRI_cutout)
+        dset_inter.update( geo )
+
+    return dset_inter
+
+######################################################################
+######################################################################
+
+
+# state shared by file reader tasks (set by `init_sim_reader`)
+sim_reader_state = {}
+
+
+def init_sim_reader( state ):
+
+    '''
+    Sets the state shared by all file reader tasks.
+
+    Used as worker initializer for process pools such that index and 
+    reprojection parameters are passed once per worker, not once per file.
+
+
+    Parameters
+    ----------
+    state : dict
+        reader state (see `read_and_reproject_sim_file`)
+    '''
+
+    sim_reader_state.clear()
+    sim_reader_state.update( state )
+
+    return
+
+######################################################################
+######################################################################
+
+
+def read_and_reproject_sim_file( fname, state = None, din = None ):
+
+    '''
+    Reads ICON field vectors from one file and reprojects them onto the 
+    Msevi grid (if requested).
+
+
+    Parameters
+    ----------
+    fname : str
+        name of ICON file
+
+    state : dict, optional, default = None
+        reader state with keys 'reader_function', 'reader_kwargs', 
+        'variable_list', 'reproject', 'ind', 'rparam' and 'reprojection_kwargs',
+        if None the state set by `init_sim_reader` is used
+
+    din : dict of numpy arrays, optional, default = None
+        field vectors if already read from fname
+
+
+    Returns
+    --------
+    dset : dict of numpy arrays
+        set of (reprojected) fields in variable list
+
+    time : numpy array
+        time of fname
+    '''
+
+    if state is None:
+        state = sim_reader_state
+
+    # input
+    if din is None:
+        din = state['reader_function'](fname, **state['reader_kwargs'])
+
+    return reproject_sim_data( din, state = state ), read_time( fname )
+
+######################################################################
+######################################################################
+
+
+def read_sim_file( fname, state = None ):
+
+    '''
+    Reads ICON field vectors and time from one file (input stage of 
+    `read_and_reproject_sim_file`).
+
+
+    Parameters
+    ----------
+    fname : str
+        name of ICON file
+
+    state : dict, optional, default = None
+        reader state (see `read_and_reproject_sim_file`), if None the state 
+        set by `init_sim_reader` is used
+
+
+    Returns
+    --------
+    din : dict of numpy arrays
+        field vectors as returned by the reader function
+
+    time : numpy array
+        time of fname
+    '''
+
+    if state is None:
+        state = sim_reader_state
+
+    # file access is serialized between threads (see `tools.netcdf_lock`),
+    # the lock is held for the whole reader function (incl. its masking and 
+    # georef work), i.e. reader threads run one after another and only 
+    # overlap with reprojection and output
+    with netcdf_lock:
+        din = state['reader_function'](fname, **state['reader_kwargs'])
+        time = read_time( fname )
+
+    return din, time
+
+######################################################################
+######################################################################
+
+
+def reproject_sim_data( din, state = None ):
+
+    '''
+    Reprojects ICON field vectors onto the Msevi grid if requested 
+    (compute stage of `read_and_reproject_sim_file`).
+
+
+    Parameters
+    ----------
+    din : dict of numpy arrays
+        field vectors as returned by the reader function
+
+    state : dict, optional, default = None
+        reader state (see `read_and_reproject_sim_file`), if None the state 
+        set by `init_sim_reader` is used
+
+
+    Returns
+    --------
+    dset : dict of numpy arrays
+        set of (reprojected) fields in variable list
+    '''
+
+    if state is None:
+        state = sim_reader_state
+
+    variable_list = state['variable_list']
+
+    # do intrepolation to MSG grid
+    if state['reproject']:
+        din = reproj_vector2msevi( din, variable_list, state['ind'], state['rparam'], 
+                                   reprojection_kwargs = state['reprojection_kwargs'],
+                                   add_georef = False )
+
+    return dict( [ (k, din[k]) for k in variable_list ] )
+
+######################################################################
+######################################################################
+
+
+def iter_sim_files( flist, input_param, interpolation2msevi = True ):
+    
+    '''
+    Reads (and reprojects) ICON field vectors file by file.
+
+    The first file is read immediately to set up the reprojection, the 
+    remaining files are read lazily (see `read_generic_sim_data_flist` for
+    the input parameters).
+
+
+    Parameters
+    ----------
+    flist : list of str
+        filename  list of ICON file (should be netcdf file)
+
+    input_param : dict
+        set of input parameters incl. function for data reading and kwargs
+
+    interpolation2msevi : bool, optional, default = True
+        switch if output should be interpolated to MSG grid
+
+
+    Returns
+    -------
+    reader : dict
+        reader setup incl. 'variable_list', 'georef', 'roperator' (None if 
+        files are reprojected one by one) and 'reprojection_kwargs'
+
+    results : generator
+        yields tuple of (field set, time) for each file (sorted by name)
+    '''
+
+
+
+    # check input paramaters -----------------------------------------
+    mandatory_input_keys = ['reader_function',
+                             'reader_kwargs',
+                             'variable_list']
+
+    for k in mandatory_input_keys:
+        if not k in list(input_param.keys()):
+            raise ValueError('%s should be defined in input_param' % k)
+    # ================================================================
+
+
+
+    # get input properties
+    reader_function = input_param.get('reader_function', None)
+    reader_kwargs   = input_param.get('reader_kwargs', None)
+    variable_list   = input_param.get('variable_list', None)
+    reprojection_kwargs = input_param.get('reprojection_kwargs', {} )
+    use_reproj_cache = input_param.get('use_reproj_cache', True )
+    index_kwargs = input_param.get('index_kwargs', {} )
+    reprojection_method = input_param.get('reprojection_method', 'combined')
+
+    executor = input_param.get('executor', None)
+    nworkers = input_param.get('nworkers', None)
+    use_time_catalog = input_param.get('use_time_catalog', False)
+    prefetch = input_param.get('prefetch', 0)
+    prefetch_workers = input_param.get('prefetch_workers', 1)
+
+    if reprojection_method not in ['combined', 'sparse', 'conservative']:
+        raise ValueError('reprojection_method %s not available' % reprojection_method)
+
+
+    flist = sorted( flist )
+
+    # read all file times at once
+    if use_time_catalog:
+        update_time_catalog( flist, nworkers = nworkers or 8 )
+
+
+    # first file: get reprojection parameters ------------------------
+    fname = flist[0]
+    din = reader_function(fname, **reader_kwargs)
+
+    ind, rparam, roperator = None, None, None
+
+    if interpolation2msevi and reprojection_method == 'conservative':
+        roperator = get_conservative_reproj_operator( fname, 
+                                                      region = SEVIRI_cutout,
+                                                      use_cache = use_reproj_cache )
+
+        if roperator['matrix'].shape[1] != len( din[variable_list[0]] ):
+            raise ValueError('ICON vectors do not fit to grid vertices')
+
+    elif interpolation2msevi:
+        ind, rparam = get_vector2msevi_reproj( fname, din, 
+                                               region = SEVIRI_cutout,
+                                               use_cache = use_reproj_cache,
+                                               index_kwargs = index_kwargs )
+
+        if reprojection_method == 'sparse':
+            roperator = reproj.get_reproj_operator( ind, rparam,
+                            apply_mask = reprojection_kwargs.get('apply_mask', True),
+                            only_apply_nn = reprojection_kwargs.get('only_apply_nn', False) )
+
+
+    # georef
+    if interpolation2msevi:
+        geo = reproj.msevi_lonlat(return_azi_zen = True, region = SEVIRI_cutout)
+    else:
+        geo = din
+
+    reader = dict( variable_list = variable_list,
+                   georef = dict( [ (k, geo[k]) for k in ['lon', 'lat', 'zen', 'azi'] ] ),
+                   roperator = roperator,
+                   reprojection_kwargs = reprojection_kwargs )
+    # ================================================================
+
+
+    # loop over file list --------------------------------------------
+    state = dict( reader_function = reader_function,
+                  reader_kwargs = reader_kwargs,
+                  variable_list = variable_list,
+                  reproject = interpolation2msevi and roperator is None,
+                  ind = ind,
+                  rparam = rparam,
+                  reprojection_kwargs = reprojection_kwargs )
+
+    # first file has already been read
+    results = [ read_and_reproject_sim_file( fname, state = state, din = din ), ]
+    del din, geo
+
+    # remaining files (possibly in parallel, order is kept)
+    if executor is None and prefetch > 0:
+
+        # reader threads load the next files while the calling thread 
+        # reprojects the current one (at most prefetch files are held),
+        # file access itself is serialized by `tools.netcdf_lock`
+        raw = ordered_map( functools.partial( read_sim_file, state = state ), flist[1:],
+                           executor = 'thread',
+                           nworkers = prefetch_workers,
+                           max_pending = prefetch + 1 )
+
+        remaining = ( (reproject_sim_data( din, state = state ), time) for din, time in raw )
+
+    else:
+        if executor == 'process':
+            task, initializer, initargs = read_and_reproject_sim_file, init_sim_reader, (state,)
+        else:
+            task, initializer, initargs = functools.partial( read_and_reproject_sim_file, 
+                                                             state = state ), None, ()
+
+        remaining = ordered_map( task, flist[1:], 
+                                 executor = executor,
+                                 nworkers = nworkers,
+                                 initializer = initializer, 
+                                 initargs = initargs )
+
+    results = itertools.chain( results, remaining )
+    # ================================================================
+    
+    return reader, results
+
+######################################################################
+######################################################################
+
+
+def read_generic_sim_data_flist( flist, 
+                                 input_param,
+                                 interpolation2msevi = True ):
+    
+    '''
+    Reads ICON field vectors from filelist as time stack.
+
+
+    Parameters
+    ----------
+    flist : list of str
+        filename  list of ICON file (should be netcdf file)
+
+    input_param : dict
+        set of input parameters incl. function for data reading and kwargs
+        mandatory keys: 'reader_function', 'reader_kwargs', 'variable_list'
+        optional keys: 'reprojection_kwargs', 'use_reproj_cache', 'index_kwargs',
+        'reprojection_method', 'executor', 'nworkers', 'use_time_catalog',
+        'prefetch', 'prefetch_workers'
+
+        reprojection_method = 'combined' (default) reprojects file by file with
+        `reproj.combined_reprojection`, reprojection_method = 'sparse' reads all 
+        files first and reprojects the full time stack with one sparse-matrix
+        product, reprojection_method = 'conservative' does the same with 
+        area-weighted remapping of ICON triangles
+
+        executor = None (default) reads files sequentially, executor = 'thread'
+        or 'process' reads (and reprojects) files in a pool of 'nworkers'
+        workers, the order of the output stays the same (threads only 
+        overlap reprojection: the reader functions run one after another
+        under `tools.netcdf_lock` because netcdf/hdf5 libraries are not 
+        thread-safe, use 'process' for parallel reading)
+
+        use_time_catalog = True reads all file times in parallel in advance
+        (see `update_time_catalog`)
+
+        prefetch > 0 (for executor = None) reads up to 'prefetch' files ahead
+        in 'prefetch_workers' (default 1) threads while the current file is 
+        reprojected, memory is bounded by the prefetch depth (reads are
+        serialized by `tools.netcdf_lock`, more than one prefetch worker 
+        does not speed up reading)
+
+    interpolation2msevi : bool, optional, default = True
+        switch if output should be interpolated to MSG grid
+
+
+
+    Returns
+    -------
+    dataset : dict of numpy arrays
+        set of synsat and georef vectors
+    '''
+
+
+
+    # file input
+    reader, results = iter_sim_files( flist, input_param, 
+                                      interpolation2msevi = interpolation2msevi )
+
+    variable_list = reader['variable_list']
+    roperator = reader['roperator']
+
+
+    # init data set
+    dataset = dict( time = [] )
+
+    for dset, time in results:
+
         # stack the data
         for k in variable_list:
             if not k in dataset:
@@ -565,19 +1911,14 @@ def read_generic_sim_data_flist( flist,
 
             dataset[k] += [  np.ma.expand_dims(dset[k], axis = 0), ]
 
-        time = read_time( fname )
         dataset['time'] += [time,]
 
+
     if interpolation2msevi:
         dataset['msevi_region'] =   SEVIRI_cutout
         dataset['nwcsaf_region'] =  NWCSAF_region
  
 
-    # add georef
-    for k in ['lon', 'lat', 'zen', 'azi']:
-        dataset[k] = dset[k]
-
-
     # stack data along time axis
     vnames = variable_list + ['time',]
     for k in vnames:
@@ -586,15 +1927,94 @@ def read_generic_sim_data_flist( flist,
     dataset['time'] = dataset['time'].squeeze()
 
 
+    # reprojection of full time stack
+    if roperator is not None:
+        for k in variable_list:
+            dataset[k] = reproj.apply_reproj_operator( roperator, dataset[k], 
+                                                       Nan = reader['reprojection_kwargs'].get('Nan', 0) )
+
+
+    # add georef
+    dataset.update( reader['georef'] )
+
     return dataset
 
 ######################################################################
 ######################################################################
 
 
+def iter_generic_sim_data_flist( flist, 
+                                 input_param,
+                                 interpolation2msevi = True ):
+    
+    '''
+    Reads ICON field vectors from filelist and yields one time step at a 
+    time (streaming version of `read_generic_sim_data_flist`).
+
+    Each yielded set has the same layout as the output of 
+    `read_generic_sim_data_flist` with a time stack of length one.
+
+
+    Parameters
+    ----------
+    flist : list of str
+        filename  list of ICON file (should be netcdf file)
+
+    input_param : dict
+        set of input parameters incl. function for data reading and kwargs
+        (see `read_generic_sim_data_flist`)
+
+    interpolation2msevi : bool, optional, default = True
+        switch if output should be interpolated to MSG grid
+
+
+    Returns
+    -------
+    dsets : generator
+        yields dict of numpy arrays with fields and georef for each time step
+    '''
+
+    # file input
+    reader, results = iter_sim_files( flist, input_param, 
+                                      interpolation2msevi = interpolation2msevi )
+
+    variable_list = reader['variable_list']
+    roperator = reader['roperator']
+
+
+    for dset, time in results:
+
+        dstep = dict( time = np.array( [time,] ) )
+
+        for k in variable_list:
+            v = dset[k]
+
+            if roperator is not None:
+                v = reproj.apply_reproj_operator( roperator, v, 
+                                                  Nan = reader['reprojection_kwargs'].get('Nan', 0) )
+
+            dstep[k] = np.ma.expand_dims(v, axis = 0)
+
+
+        if interpolation2msevi:
+            dstep['msevi_region'] =   SEVIRI_cutout
+            dstep['nwcsaf_region'] =  NWCSAF_region
+
+        dstep.update( reader['georef'] )
+
+        yield dstep
+
+    return
+
+######################################################################
+######################################################################
+
+
 def read_radiation_flux_flist( flist, 
                                use_clear = False,
-                               interpolation2msevi = True ):
+                               interpolation2msevi = True,
+                               streaming = False,
+                               prefetch = 0 ):
     
     '''
     Reads ICON TOA radiation vectors from filelist as time stack.
@@ -611,10 +2031,17 @@ def read_radiation_flux_flist( flist,
     use_clear :  bool, optional, default = False
         switch if clearsky or cloudy values are used
 
+    streaming : bool, optional, default = False
+        if True, a generator is returned that yields one time step at a time
+
+    prefetch : int, optional, default = 0
+        number of files read ahead while the current file is reprojected 
+        (see `read_generic_sim_data_flist`)
+
 
     Returns
     -------
-    radset : dict of numpy arrays
+    radset : dict of numpy arrays (or generator of them for streaming = True)
         set of TOA radiation and georef vectors
     '''
 
@@ -626,15 +2053,21 @@ def read_radiation_flux_flist( flist,
 
     input_param = dict(  variable_list = variable_list,
                          reader_function =  reader_function,
-                         reader_kwargs = reader_kwargs)
+                         reader_kwargs = reader_kwargs,
+                         prefetch = prefetch)
     # ================================================================
 
 
 
     # data input -----------------------------------------------------
-    radset = read_generic_sim_data_flist( flist, 
-                                          input_param,
-                                          interpolation2msevi = interpolation2msevi )
+    if streaming:
+        read_function = iter_generic_sim_data_flist
+    else:
+        read_function = read_generic_sim_data_flist
+
+    radset = read_function( flist, 
+                            input_param,
+                            interpolation2msevi = interpolation2msevi )
     # ================================================================
 
 
@@ -644,7 +2077,9 @@ def read_radiation_flux_flist( flist,
 ######################################################################
 
 def read_synsat_flist( flist, 
-                       interpolation2msevi = True ):
+                       interpolation2msevi = True,
+                       streaming = False,
+                       prefetch = 0 ):
     
     '''
     Reads ICON Synsat vectors from filelist as time stack.
@@ -658,10 +2093,17 @@ def read_synsat_flist( flist,
     interpolation2msevi : bool, optional, default = True
         switch if output should be interpolated to MSG grid
 
+    streaming : bool, optional, default = False
+        if True, a generator is returned that yields one time step at a time
+
+    prefetch : int, optional, default = 0
+        number of files read ahead while the current file is reprojected 
+        (see `read_generic_sim_data_flist`)
+
 
     Returns
     -------
-    btset : dict of numpy arrays
+    btset : dict of numpy arrays (or generator of them for streaming = True)
         set of synsat and georef fields
     '''
 
@@ -673,15 +2115,21 @@ def read_synsat_flist( flist,
 
     input_param = dict(  variable_list = variable_list,
                          reader_function =  reader_function,
-                         reader_kwargs = reader_kwargs)
+                         reader_kwargs = reader_kwargs,
+                         prefetch = prefetch)
     # ================================================================
 
 
 
     # data input -----------------------------------------------------
-    btset = read_generic_sim_data_flist( flist, 
-                                         input_param,
-                                         interpolation2msevi = interpolation2msevi )
+    if streaming:
+        read_function = iter_generic_sim_data_flist
+    else:
+        read_function = read_generic_sim_data_flist
+
+    btset = read_function( flist, 
+                           input_param,
+                           interpolation2msevi = interpolation2msevi )
     # ================================================================
 
 
@@ -721,9 +2169,11 @@ def read_simulated_clearsky_flux(itime, expname, ind = None, do_regrid = True):
         dataset containing clearsky fluxes and georef
     '''
     
-    # get filename
-    fdir = '%s/%s' % (simulation_dir, expname)
-    fname = glob.glob('%s/%s*2drad_30min*%s.nc' % (fdir, expname, str(2*itime).zfill(4)))[0]
+    # get filename (from file catalog)
+    fname = lookup_sim_file( expname, '2drad_30min', step = 2*itime )
+
+    if fname is None:
+        raise IOError('no 2drad_30min file for step %d in experiment %s' % (2*itime, expname))
     
     
     # read simulation fields
@@ -13,6 +13,7 @@ Esp. for
 
 
 import os, sys, glob, copy
+import functools, itertools
 import numpy as np
 import xarray as xr
 import datetime
@@ -20,9 +21,14 @@ import datetime
 # a little hack for readthedocs
 from tropy.standard_config import local_data_path
 import tropy.analysis_tools.grid_and_interpolation as gi
+import tropy.io_tools.netcdf as ncio
 
-from .tools import convert_time
+from ..config import meteosat_georef_file
+from .tools import convert_time, ordered_map
 from .input_obs import read_msevi, read_radiation_flux_tstack
+from .input_obs import read_msevi_georef, read_msevi_slot, msevi_setting, msevi_chanlist
+from .input_obs import stack_msevi_slots
+from .input_obs import read_radiation_flux_slot
 
 
 
@@ -171,6 +177,15 @@ def save_meteosat_bt2nc( outname, dset, fill_val = 0 ):
         outset['zen'] = (['rows', 'cols'], dset['zen'], att_zen)
 
 
+    # flag of missing input slots
+    if 'slot_missing' in dset:
+        att_flag = dict( long_name = 'flag for missing input slot',
+                         flag_values = '0, 1',
+                         flag_meanings = 'available missing' )
+
+        outset['slot_missing'] = (['time',], np.array( dset['slot_missing'], dtype = np.int8 ), att_flag)
+
+
     # include region defintions
 
     reg = np.array( dset['msevi_region'] )
@@ -369,6 +384,15 @@ def save_rad2nc( outname, dset, fill_val = 0 ):
                        'scale_factor': 0.25}
 
 
+    # flag of missing input slots
+    if 'slot_missing' in dset:
+        att_flag = dict( long_name = 'flag for missing input slot',
+                         flag_values = '0, 1',
+                         flag_meanings = 'available missing' )
+
+        outset['slot_missing'] = (['time',], np.array( dset['slot_missing'], dtype = np.int8 ), att_flag)
+
+
 
 
    # Create the data set
@@ -387,5 +411,256 @@ def save_rad2nc( outname, dset, fill_val = 0 ):
 
     return 
 
+
+######################################################################
+# (3) Multi-day Stacks
+######################################################################
+
+
+def iter_daily_slots( date1, date2, read_slot, 
+                      ntimes = 24, 
+                      executor = 'process', 
+                      nworkers = None ):
+
+    '''
+    Reads hourly time slots for a range of days in a worker pool.
+
+    All (date, slot) reads are scheduled in one pool, results are returned 
+    in time order such that days are completed one after the other.
+
+    
+    Parameters
+    ----------
+    date1 : str
+        first date string as %Y%m%d
+
+    date2 : str
+        last date string as %Y%m%d (included)
+
+    read_slot : function
+        reads one time slot, takes datetime object and returns None if 
+        the slot is missing (has to be picklable for process pools)
+
+    ntimes : int, optional, default = 24
+        number of time steps per day (starting at mid-night)
+
+    executor : str, optional, default = 'process'
+        type of worker pool (see `tools.ordered_map`), None reads serially
+
+    nworkers : int, optional, default = None
+        number of workers (None uses the number of CPUs)
+
+
+    Returns
+    -------
+    slots : generator
+        yields tuple of (date, slot number, time, slot data)
+    '''
+
+    t1 = datetime.datetime.strptime( date1, '%Y%m%d')
+    t2 = datetime.datetime.strptime( date2, '%Y%m%d')
+
+    slots = []
+    day = t1
+    while day <= t2:
+        for n in range( ntimes ):
+            slots.append( (day.strftime('%Y%m%d'), n, day + datetime.timedelta( hours = n )) )
+
+        day += datetime.timedelta( days = 1 )
+
+    results = ordered_map( read_slot, [ t for date, n, t in slots ],
+                           executor = executor, 
+                           nworkers = nworkers )
+
+    for (date, n, t), result in zip( slots, results ):
+        yield date, n, t, result
+
+    return
+
+######################################################################
+######################################################################
+
+
+def save_meteosat_tstack_range( date1, date2, 
+                                outname = None, 
+                                zen_max = 75., 
+                                executor = 'process', 
+                                nworkers = None ):    
+
+    '''
+    Saves daily time stacks of Meteosat BT data for a range of dates 
+    (one netcdf file per day).
+
+    Slots are read in parallel (see `iter_daily_slots`), missing slots are 
+    written as NaN and flagged in the 'slot_missing' variable. Each day is 
+    written as soon as all of its slots are available.
+
+    
+    Parameters
+    ----------
+    date1 : str
+        first date string as %Y%m%d
+
+    date2 : str
+        last date string as %Y%m%d (included)
+
+    outname : str, optional, default = None
+        output file name pattern with '%s' for the date, if None a local 
+        dir on altair is chosen
+
+    zen_max : float, optional, default = 75.
+        maximum satellite zenith angle 
+
+    executor : str, optional, default = 'process'
+        type of worker pool (see `tools.ordered_map`)
+
+    nworkers : int, optional, default = None
+        number of workers (None uses the number of CPUs)
+
+
+    Returns
+    -------
+    None
+    '''
+
+    if outname is None:
+        outname = '%s/icon/nawdex/meteosat/msevi-nawdex-%s.nc' % (local_data_path, '%s')
+
+    ntimes = 24
+
+    # georef is the same for all days
+    georef, zenmask = read_msevi_georef( datetime.datetime.strptime( date1, '%Y%m%d'), 
+                                         zen_max = zen_max )
+    sett = msevi_setting( datetime.datetime.strptime( date1, '%Y%m%d') )
+
+    slots = iter_daily_slots( date1, date2, read_msevi_slot, 
+                              ntimes = ntimes,
+                              executor = executor, 
+                              nworkers = nworkers )
+
+    # each day is stacked and written as soon as its slots are available
+    for date, day_slots in itertools.groupby( slots, key = lambda slot: slot[0] ):
+
+        d = stack_msevi_slots( ( (t, bt) for _, _, t, bt in day_slots ), 
+                               ntimes, zenmask, dtype = np.float32 )
+
+        d.update( georef )
+        d['msevi_region'] = sett['region']
+        d['nwcsaf_region'] = sett['nwcsaf_region']
+
+        save_meteosat_bt2nc( outname % date, d )
+
+    return
+
+######################################################################
+######################################################################
+
+
+def save_radflux_tstack_range( date1, date2, 
+                               indir = '/vols/talos/home/fabian/data/gerb-like/',
+                               outname = None, 
+                               georef_file = None,
+                               fused = False,
+                               executor = 'process', 
+                               nworkers = None ):    
+
+    '''
+    Saves daily time stacks of TOA radiation flux data for a range of dates 
+    (one netcdf file per day).
+
+    Slots are read in parallel (see `iter_daily_slots`), missing slots are 
+    written as NaN and flagged in the 'slot_missing' variable. Each day is 
+    written as soon as all of its slots are available.
+
+    
+    Parameters
+    ----------
+    date1 : str
+        first date string as %Y%m%d
+
+    date2 : str
+        last date string as %Y%m%d (included)
+
+    indir : str, optional, default = '/vols/talos/home/fabian/data/gerb-like/'
+        input file directory name
+
+    outname : str, optional, default = None
+        output file name pattern with '%s' for the date, if None a local 
+        dir on altair is chosen
+
+    georef_file : str, optional, default = None
+        filename where lon and lat can be found, `meteosat_georef_file` if None
+
+    fused : bool, optional, default = False
+        if the cutout-first upsampling is used (see `read_radiation_fluxes`)
+
+    executor : str, optional, default = 'process'
+        type of worker pool (see `tools.ordered_map`)
+
+    nworkers : int, optional, default = None
+        number of workers (None uses the number of CPUs)
+
+
+    Returns
+    -------
+    None
+    '''
+
+    if outname is None:
+        outname = '%s/icon/nawdex/gerb-like/toa_radflux-nawdex-%s.nc' % (local_data_path, '%s')
+
+    if georef_file is None:
+        georef_file = meteosat_georef_file
+
+    ntimes = 24
+    vnames = ['lwf', 'swf_net', 'swf_up']
+
+    # georef is the same for all days
+    georef = ncio.read_icon_4d_data( georef_file, ['lon', 'lat'], itime = None )
+    nrow, ncol = georef['lon'].shape
+
+    read_slot = functools.partial( read_radiation_flux_slot, fdir = indir, fused = fused )
+
+    for date, n, t, rad in iter_daily_slots( date1, date2, read_slot, 
+                                             ntimes = ntimes,
+                                             executor = executor, 
+                                             nworkers = nworkers ):
+
+        # init day stacks --------------------------------------------
+        if n == 0:
+            stacks = {}
+            for vname in vnames:
+                stacks[vname] = np.empty( (ntimes, nrow, ncol), dtype = np.float32 )
+
+            d = dict( time = [], slot_missing = np.zeros( ntimes, dtype = np.int8 ) )
+        # ============================================================
+
+
+        # fill slot --------------------------------------------------
+        d['time'].append( t )
+
+        for vname in vnames:
+            if rad is None:
+                stacks[vname][n] = np.nan
+            else:
+                stacks[vname][n] = rad[vname]
+
+        if rad is None:
+            d['slot_missing'][n] = 1
+        # ============================================================
+
+
+        # write complete day -----------------------------------------
+        if n == ntimes - 1:
+            for vname in vnames:
+                d[vname] = np.ma.masked_invalid( stacks[vname], copy = False )
+
+            d.update( georef )
+
+            save_rad2nc( outname % date, d )
+        # ============================================================
+
+    return
+
 ######################################################################
 ######################################################################
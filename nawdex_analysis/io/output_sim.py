@@ -15,12 +15,13 @@ Esp. for
 import os, sys, glob, copy
 import numpy as np
 import xarray as xr
+import netCDF4
 import datetime
 
 import tropy.analysis_tools.grid_and_interpolation as gi
 from tropy.standard_config import local_data_path
 
-from .tools import convert_time
+from .tools import convert_time, queued_consumer, netcdf_lock
 from .input_sim import read_radiation_flux_flist, read_synsat_flist
 
 
@@ -30,7 +31,10 @@ from .input_sim import read_radiation_flux_flist, read_synsat_flist
 
 
 def save_synsat_flist( flist, outname, 
-                        interpolation2msevi = True ):    
+                        interpolation2msevi = True,
+                        streaming = False,
+                        prefetch = 0,
+                        writer_queue = 0 ):    
 
     '''
     Saves full time stack of simulated BT data to netcdf file.
@@ -47,6 +51,17 @@ def save_synsat_flist( flist, outname,
     interpolation2msevi : bool, optional, default = True
         switch if output should be interpolated to MSG grid
 
+    streaming : bool, optional, default = False
+        if True, time steps are read and appended to the output file one 
+        at a time (constant memory)
+
+    prefetch : int, optional, default = 0
+        number of files read ahead while the current file is reprojected 
+
+    writer_queue : int, optional, default = 0
+        number of time steps buffered for a background writer thread 
+        (only used with streaming = True)
+
 
     Returns
     -------
@@ -56,21 +71,26 @@ def save_synsat_flist( flist, outname,
 
     # input of radiation data
     dout = read_synsat_flist( flist, 
-                              interpolation2msevi = interpolation2msevi )
+                              interpolation2msevi = interpolation2msevi,
+                              streaming = streaming,
+                              prefetch = prefetch )
 
 
     # output 
-    save_synsat_bt2nc( outname, dout )
+    if streaming:
+        save_synsat_bt2nc_stream( outname, dout, writer_queue = writer_queue )
+    else:
+        save_synsat_bt2nc( outname, dout )
 
     return
 
 ######################################################################
 ######################################################################
 
-def save_synsat_bt2nc( outname, dset, fill_val = 0 ):
+def synsat_bt2dataset( dset, fill_val = 0 ):
 
     '''
-    Saves Synsat BTs to netcdf.
+    Converts Synsat BTs into xarray dataset for netcdf output.
 
 
     Parameters
@@ -79,16 +99,17 @@ def save_synsat_bt2nc( outname, dset, fill_val = 0 ):
         BT dataset to be saved into netcdf
         dataset incl. lon, lat, time, and BTs
 
-    outname : str
-        output filename
-
     fill_val : float or int, optional, default = 0
         fill value to be replace by NaNs
 
 
     Returns
     --------
-    None
+    ds_out : xarray Dataset
+        output dataset
+
+    encoding : dict
+        netcdf encoding of output variables
     '''
 
     # Replacing NaN with FillValue
@@ -196,13 +217,78 @@ def save_synsat_bt2nc( outname, dset, fill_val = 0 ):
                         attrs = att_glob)
 
 
+    return ds_out, encoding
+
+######################################################################
+######################################################################
+
+def save_synsat_bt2nc( outname, dset, fill_val = 0 ):
+
+    '''
+    Saves Synsat BTs to netcdf.
 
 
+    Parameters
+    ----------
+    dset : dict of numpy arrays
+        BT dataset to be saved into netcdf
+        dataset incl. lon, lat, time, and BTs
+
+    outname : str
+        output filename
+
+    fill_val : float or int, optional, default = 0
+        fill value to be replace by NaNs
+
+
+    Returns
+    --------
+    None
+    '''
+
+    ds_out, encoding = synsat_bt2dataset( dset, fill_val = fill_val )
+
     print(('... write output to', outname))
     ds_out.to_netcdf(outname, encoding = encoding)
 
     return 
 
+######################################################################
+######################################################################
+
+def save_synsat_bt2nc_stream( outname, dsets, fill_val = 0, writer_queue = 0 ):
+
+    '''
+    Saves a stream of Synsat BT time steps to netcdf (in constant memory).
+
+
+    Parameters
+    ----------
+    outname : str
+        output filename
+
+    dsets : iterable of dicts
+        BT datasets (e.g. single time steps, see `save_synsat_bt2nc`)
+
+    fill_val : float or int, optional, default = 0
+        fill value to be replace by NaNs
+
+    writer_queue : int, optional, default = 0
+        number of time steps buffered for a background writer thread
+        (see `save_dataset_stream`), 0 writes in the calling thread
+
+
+    Returns
+    --------
+    None
+    '''
+
+    save_dataset_stream( outname, dsets, synsat_bt2dataset, 
+                         writer_queue = writer_queue,
+                         fill_val = fill_val )
+
+    return 
+
 
 ######################################################################
 # (2) TOA radiation fluxes
@@ -211,7 +297,10 @@ def save_synsat_bt2nc( outname, dset, fill_val = 0 ):
 
 def save_radflux_flist( flist, outname, 
                         use_clear = False,
-                        interpolation2msevi = True ):    
+                        interpolation2msevi = True,
+                        streaming = False,
+                        prefetch = 0,
+                        writer_queue = 0 ):    
 
     '''
     Saves full time stack of simulated TOA radiation flux data to netcdf file.
@@ -231,6 +320,17 @@ def save_radflux_flist( flist, outname,
     use_clear :  bool, optional, default = False
         switch if clearsky or cloudy values are used
 
+    streaming : bool, optional, default = False
+        if True, time steps are read and appended to the output file one 
+        at a time (constant memory)
+
+    prefetch : int, optional, default = 0
+        number of files read ahead while the current file is reprojected 
+
+    writer_queue : int, optional, default = 0
+        number of time steps buffered for a background writer thread 
+        (only used with streaming = True)
+
 
     Returns
     -------
@@ -241,11 +341,16 @@ def save_radflux_flist( flist, outname,
     # input of radiation data
     dout = read_radiation_flux_flist( flist, 
                                       use_clear = use_clear,
-                                      interpolation2msevi = interpolation2msevi )
+                                      interpolation2msevi = interpolation2msevi,
+                                      streaming = streaming,
+                                      prefetch = prefetch )
 
 
     # output 
-    save_rad2nc( outname, dout )
+    if streaming:
+        save_rad2nc_stream( outname, dout, writer_queue = writer_queue )
+    else:
+        save_rad2nc( outname, dout )
 
     return
 
@@ -253,10 +358,10 @@ def save_radflux_flist( flist, outname,
 ######################################################################
 
 
-def save_rad2nc( outname, dset, fill_val = 0, use_clear = False ):
+def rad2dataset( dset, fill_val = 0, use_clear = False ):
 
     '''
-    Saves Radiaiton fluxes to netcdf.
+    Converts radiation fluxes into xarray dataset for netcdf output.
 
 
     Parameters
@@ -265,9 +370,6 @@ def save_rad2nc( outname, dset, fill_val = 0, use_clear = False ):
         TOA radiation flux dataset to be saved into netcdf
         dataset incl. lon, lat, time, and lwf, swf_net
 
-    outname : str
-        output filename
-
     fill_val : float or int, optional, default = 0
         fill value to be replace by NaNs
 
@@ -277,7 +379,11 @@ def save_rad2nc( outname, dset, fill_val = 0, use_clear = False ):
 
     Returns
     --------
-    None
+    ds_out : xarray Dataset
+        output dataset
+
+    encoding : dict
+        netcdf encoding of output variables
     '''
 
     # Replacing NaN with FillValue
@@ -383,7 +489,40 @@ def save_rad2nc( outname, dset, fill_val = 0, use_clear = False ):
                         attrs = att_glob)
 
 
+    return ds_out, encoding
+
+######################################################################
+######################################################################
+
+
+def save_rad2nc( outname, dset, fill_val = 0, use_clear = False ):
+
+    '''
+    Saves Radiaiton fluxes to netcdf.
+
+
+    Parameters
+    ----------
+    dset : dict of numpy arrays
+        TOA radiation flux dataset to be saved into netcdf
+        dataset incl. lon, lat, time, and lwf, swf_net
+
+    outname : str
+        output filename
+
+    fill_val : float or int, optional, default = 0
+        fill value to be replace by NaNs
+
+    use_clear :  bool, optional, default = False
+        switch if clearsky or cloudy values are used
+
+
+    Returns
+    --------
+    None
+    '''
 
+    ds_out, encoding = rad2dataset( dset, fill_val = fill_val, use_clear = use_clear )
 
     print(('... write output to', outname))
     ds_out.to_netcdf(outname, encoding = encoding)
@@ -394,6 +533,47 @@ def save_rad2nc( outname, dset, fill_val = 0, use_clear = False ):
 ######################################################################
 
 
+def save_rad2nc_stream( outname, dsets, fill_val = 0, use_clear = False, writer_queue = 0 ):
+
+    '''
+    Saves a stream of radiation flux time steps to netcdf (in constant memory).
+
+
+    Parameters
+    ----------
+    outname : str
+        output filename
+
+    dsets : iterable of dicts
+        TOA radiation flux datasets (e.g. single time steps, see `save_rad2nc`)
+
+    fill_val : float or int, optional, default = 0
+        fill value to be replace by NaNs
+
+    use_clear :  bool, optional, default = False
+        switch if clearsky or cloudy values are used
+
+    writer_queue : int, optional, default = 0
+        number of time steps buffered for a background writer thread
+        (see `save_dataset_stream`), 0 writes in the calling thread
+
+
+    Returns
+    --------
+    None
+    '''
+
+    save_dataset_stream( outname, dsets, rad2dataset, 
+                         writer_queue = writer_queue,
+                         fill_val = fill_val, 
+                         use_clear = use_clear )
+
+    return 
+
+######################################################################
+######################################################################
+
+
 
 def save_retrieved_clearsky_swf2nc( outname, dset, fill_val = 0 ):
 
@@ -503,3 +683,114 @@ def save_retrieved_clearsky_swf2nc( outname, dset, fill_val = 0 ):
 
 ######################################################################
 ######################################################################
+
+
+######################################################################
+# (3) Streaming Output
+######################################################################
+
+
+def append_timesteps2nc( outname, ds_out ):
+
+    '''
+    Appends the time steps of a dataset to an existing netcdf file with 
+    unlimited time dimension.
+
+    Packing (scale factor, fill value) is done with the encoding already 
+    stored in the file.
+
+
+    Parameters
+    ----------
+    outname : str
+        output filename
+
+    ds_out : xarray Dataset
+        dataset with the same variables as stored in outname
+
+
+    Returns
+    --------
+    None
+    '''
+
+    with netCDF4.Dataset( outname, 'a' ) as f:
+
+        n1 = len( f.dimensions['time'] )
+        n2 = n1 + ds_out.sizes['time']
+
+        for vname in ['time',] + list( ds_out.data_vars ):
+
+            v = ds_out[vname]
+
+            if 'time' not in v.dims:
+                continue
+
+            f.variables[vname][n1:n2] = v.transpose( 'time', ... ).values
+
+    return
+
+######################################################################
+######################################################################
+
+
+def save_dataset_stream( outname, dsets, dataset_function, writer_queue = 0, **kwargs ):
+
+    '''
+    Saves a stream of datasets into one netcdf file with unlimited time 
+    dimension. Only one element of the stream is kept in memory (plus 
+    the elements waiting in the writer queue).
+
+
+    Parameters
+    ----------
+    outname : str
+        output filename
+
+    dsets : iterable of dicts
+        datasets (e.g. single time steps) to be saved
+
+    dataset_function : function
+        converts one element of dsets into xarray dataset and encoding,
+        e.g. `synsat_bt2dataset` or `rad2dataset`
+
+    writer_queue : int, optional, default = 0
+        if > 0, conversion and output are done in a writer thread while the
+        next elements of dsets are generated, at most writer_queue elements 
+        wait for output (see `tools.queued_consumer`), file output is 
+        serialized with reader threads by `tools.netcdf_lock`
+
+    **kwargs : 
+        keyword arguments passed to dataset_function
+
+
+    Returns
+    --------
+    None
+    '''
+
+    def write( dsets ):
+
+        for n, dset in enumerate( dsets ):
+
+            ds_out, encoding = dataset_function( dset, **kwargs )
+
+            # file access is serialized with (prefetching) reader threads
+            with netcdf_lock:
+                if n == 0:
+                    print(('... write output to', outname))
+                    ds_out.to_netcdf(outname, encoding = encoding, unlimited_dims = ['time',])
+
+                else:
+                    append_timesteps2nc( outname, ds_out )
+
+
+    if writer_queue > 0:
+        queued_consumer( write, dsets, queue_size = writer_queue )
+    else:
+        write( dsets )
+
+    return
+
+######################################################################
+######################################################################
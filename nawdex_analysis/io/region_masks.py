@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+'''
+Process-wide registry of NAWDEX region masks.
+
+Masks are read from the region mask file only once per process (on first
+request) and are handed out as shared, read-only arrays.
+'''
+
+import threading
+import numpy as np
+
+import tropy.io_tools.hdf as hio
+
+from ..config import nawdex_regions_file
+from .tools import netcdf_lock
+
+######################################################################
+# (1) Mask Registry
+######################################################################
+
+
+# store of region masks and flat mask indices
+region_mask_store = {}
+region_index_store = {}
+
+region_mask_lock = threading.Lock()
+
+
+def get_region_mask( region = 'full_region', mfile = None ):
+
+    '''
+    Returns region mask from the registry (read from file on first request).
+
+
+    Parameters
+    ----------
+    region : str, optional, default = 'full_region'
+        region keyword
+
+    mfile : str, optional, default = None
+        name of region mask file, `nawdex_regions_file` from config if None
+
+
+    Returns
+    --------
+    mask : numpy array, bool
+        region mask (shared and read-only)
+    '''
+
+    if mfile is None:
+        mfile = nawdex_regions_file
+
+    key = (mfile, region)
+
+    with region_mask_lock:
+
+        if key not in region_mask_store:
+
+            # hdf5 access is serialized with other reader / writer threads
+            with netcdf_lock:
+                mask = hio.read_var_from_hdf( mfile, region ).astype( bool )
+
+            mask.flags.writeable = False
+
+            region_mask_store[key] = mask
+
+    return region_mask_store[key]
+
+######################################################################
+######################################################################
+
+
+def get_region_index( region = 'full_region', mfile = None ):
+
+    '''
+    Returns flat index of mask pixels from the registry.
+
+
+    Parameters
+    ----------
+    region : str, optional, default = 'full_region'
+        region keyword
+
+    mfile : str, optional, default = None
+        name of region mask file, `nawdex_regions_file` from config if None
+
+
+    Returns
+    --------
+    index : numpy array, int
+        flat index of pixels with mask == True (shared and read-only)
+    '''
+
+    if mfile is None:
+        mfile = nawdex_regions_file
+
+    key = (mfile, region)
+
+    mask = get_region_mask( region = region, mfile = mfile )
+
+    with region_mask_lock:
+
+        if key not in region_index_store:
+            index = np.flatnonzero( mask )
+            index.flags.writeable = False
+
+            region_index_store[key] = index
+
+    return region_index_store[key]
+
+######################################################################
+######################################################################
+
+
+def clear_region_masks():
+
+    '''
+    Empties the mask registry (e.g. after the mask file has changed).
+    '''
+
+    with region_mask_lock:
+        region_mask_store.clear()
+        region_index_store.clear()
+
+    return
+
+######################################################################
+######################################################################
@@ -5,8 +5,12 @@ Tools for reprojection or regridding of data.
 '''
 
 import os, sys, copy
+import hashlib, json, tempfile, shutil
+import threading, concurrent.futures
 import numpy as np
 import scipy.ndimage
+import scipy.spatial
+import scipy.sparse
 import datetime
 import pyproj
 import warnings
@@ -15,14 +19,28 @@ import warnings
 import tropy.analysis_tools.grid_and_interpolation as gi
 import tropy.io_tools.hdf as hio
 
-from ..config import SEVIRI_cutout, nawdex_regions_file 
-from ..io.tools import  lonlat2azizen
+from .._version import __version__
+from ..config import SEVIRI_cutout, cache_dir
+from ..io.tools import  get_viewing_geometry, grid_key
+from ..io import region_masks
 
 ######################################################################
 # (1) SEVIRI projection and co-ordinate transformations
 ######################################################################
 
 
+# parameters of Meteosat geostationary projection
+msevi_geos_param = {
+        'proj':      'geos',
+        'h':     35785831.0,
+        'a':      6378169.0,
+        'b':      6356583.8,
+}
+
+# thread-local store of projection objects
+msevi_proj_store = threading.local()
+
+
 def set_msevi_proj(lon0 = 0):
         
         ''' 
@@ -31,12 +49,6 @@ def set_msevi_proj(lon0 = 0):
 
         Parameters
         ----------
-        lon : numpy array
-            longitude
-        
-        lat : numpy array
-            latitude
-
         lon0 : float, optional, default = 0
             sub-satellite longitude
 
@@ -47,13 +59,7 @@ def set_msevi_proj(lon0 = 0):
             Meteosat SEVIRI projection
 
         '''
-        geos_proj_param = {
-                'proj':      'geos',
-                'h':     35785831.0,
-                'a':      6378169.0,
-                'b':      6356583.8,
-                'lon_0':        lon0
-        }
+        geos_proj_param = dict( lon_0 = lon0, **msevi_geos_param )
         # 
         
         # Apply MSG SEVIRI satellite projection
@@ -66,7 +72,295 @@ def set_msevi_proj(lon0 = 0):
 ######################################################################
 
 
-def msevi_ll2xy(lon, lat, lon0 = 0):
+def get_msevi_proj(lon0 = 0):
+        
+        ''' 
+        Memoized geostationary projection object for Meteosat.
+
+        Projection objects are kept per sub-satellite longitude and per
+        thread (pyproj objects should not be shared between threads).
+
+
+        Parameters
+        ----------
+        lon0 : float, optional, default = 0
+            sub-satellite longitude
+
+        
+        Returns
+        -------
+        msevi_proj : pyproj object
+            Meteosat SEVIRI projection
+
+        '''
+
+        if not hasattr( msevi_proj_store, 'proj' ):
+                msevi_proj_store.proj = {}
+
+        lon0 = float( lon0 )
+        if lon0 not in msevi_proj_store.proj:
+                msevi_proj_store.proj[lon0] = set_msevi_proj( lon0 = lon0 )
+
+        return msevi_proj_store.proj[lon0]
+
+        
+######################################################################
+######################################################################
+
+
+def geos_forward(lon, lat, lon0 = 0):
+        
+        ''' 
+        Closed-form forward geostationary projection (numpy version of 
+        the PROJ 'geos' projection with sweep = 'y').
+
+
+        Parameters
+        ----------
+        lon : numpy array
+            longitude
+        
+        lat : numpy array
+            latitude
+
+        lon0 : float, optional, default = 0
+            sub-satellite longitude
+
+        
+        Returns
+        -------
+        x : numpy array
+            x-coordinate in SEVIRI projection (inf if not visible)
+        
+        y : numpy array
+            y-coordinate in SEVIRI projection (inf if not visible)
+
+        '''
+
+        # projection constants
+        a = msevi_geos_param['a']
+        b = msevi_geos_param['b']
+
+        radius_g_1 = msevi_geos_param['h'] / a
+        radius_g = 1. + radius_g_1
+        radius_p = b / a
+        radius_p2 = radius_p**2
+
+
+        # geocentric latitude
+        lam = np.deg2rad( np.asarray( lon, dtype = np.float64 ) - lon0 )
+        phi = np.arctan( radius_p2 * np.tan( np.deg2rad( lat ) ) )
+
+        # vector from earth center to point
+        cos_phi = np.cos( phi )
+        sin_phi = np.sin( phi )
+
+        r = radius_p / np.hypot( radius_p * cos_phi, sin_phi )
+
+        vx = r * np.cos( lam ) * cos_phi
+        vy = r * np.sin( lam ) * cos_phi
+        vz = r * sin_phi
+
+        # vector from satellite to point
+        tmp = radius_g - vx
+
+        x = a * radius_g_1 * np.arctan( vy / tmp )
+        y = a * radius_g_1 * np.arctan( vz / np.hypot( vy, tmp ) )
+
+        # visibility check
+        invisible = (tmp * vx - vy**2 - vz**2 / radius_p2) < 0
+        x[invisible] = np.inf
+        y[invisible] = np.inf
+
+        return x, y
+
+        
+######################################################################
+######################################################################
+
+
+def geos_inverse(x, y, lon0 = 0):
+        
+        ''' 
+        Closed-form inverse geostationary projection (numpy version of 
+        the PROJ 'geos' projection with sweep = 'y').
+
+
+        Parameters
+        ----------
+        x : numpy array
+            x-coordinate in SEVIRI projection
+        
+        y : numpy array
+            y-coordinate in SEVIRI projection
+
+        lon0 : float, optional, default = 0
+            sub-satellite longitude
+
+        
+        Returns
+        -------
+        lon : numpy array
+            longitude (inf if off disk)
+        
+        lat : numpy array
+            latitude (inf if off disk)
+
+        '''
+
+        # projection constants
+        a = msevi_geos_param['a']
+        b = msevi_geos_param['b']
+
+        radius_g_1 = msevi_geos_param['h'] / a
+        radius_g = 1. + radius_g_1
+        radius_p = b / a
+        c = radius_g**2 - 1.
+
+
+        # vector from satellite to position
+        vy = np.tan( np.asarray( x, dtype = np.float64 ) / ( a * radius_g_1 ) )
+        vz = np.tan( np.asarray( y, dtype = np.float64 ) / ( a * radius_g_1 ) ) * np.hypot( 1., vy )
+
+        # intersection with ellipsoid
+        qa = vy**2 + (vz / radius_p)**2 + 1.
+        qb = - 2. * radius_g
+        det = qb**2 - 4. * qa * c
+
+        off_disk = (det < 0)
+        det[off_disk] = 0.
+
+        k = (- qb - np.sqrt( det )) / (2. * qa)
+
+        vx = radius_g - k
+        vy = k * vy
+        vz = k * vz
+
+        # geodetic coordinates
+        lam = np.arctan2( vy, vx )
+        phi = np.arctan( vz * np.cos( lam ) / vx )
+        phi = np.arctan( np.tan( phi ) / radius_p**2 )
+
+        lon = np.rad2deg( lam ) + lon0
+        lat = np.rad2deg( phi )
+
+        if lon0 != 0:
+                lon = np.mod( lon + 180., 360. ) - 180.
+
+        lon[off_disk] = np.inf
+        lat[off_disk] = np.inf
+
+        return lon, lat
+
+        
+######################################################################
+######################################################################
+
+
+def msevi_transform(u, v, lon0 = 0, 
+                    inverse = False, 
+                    backend = 'pyproj', 
+                    nworkers = 4, 
+                    chunk_size = 500000):
+        
+        ''' 
+        Forward or inverse transformation in geostationary satellite
+        projection.
+
+        Large inputs are split into chunks that are transformed in a
+        thread pool.
+        
+
+        Parameters
+        ----------
+        u : numpy array
+            longitude (forward) or x-coordinate (inverse)
+        
+        v : numpy array
+            latitude (forward) or y-coordinate (inverse)
+
+        lon0 : float, optional, default = 0
+            sub-satellite longitude
+
+        inverse : bool, optional, default = False
+            switch for inverse transformation
+
+        backend : str, optional, default = 'pyproj'
+            projection backend, either
+
+            * 'pyproj': uses (memoized) pyproj projection objects
+            * 'numpy': uses closed-form `geos_forward` / `geos_inverse`
+
+        nworkers : int, optional, default = 4
+            number of worker threads (1 switches threading off)
+
+        chunk_size : int, optional, default = 500000
+            number of points per chunk
+
+        
+        Returns
+        -------
+        uout : numpy array
+            x-coordinate (forward) or longitude (inverse)
+        
+        vout : numpy array
+            y-coordinate (forward) or latitude (inverse)
+
+        '''
+
+        if backend not in ['pyproj', 'numpy']:
+                raise ValueError('projection backend %s unknown' % backend)
+
+        u = np.asarray( u, dtype = np.float64 )
+        v = np.asarray( v, dtype = np.float64 )
+
+        assert u.shape == v.shape
+
+        uflat = u.ravel()
+        vflat = v.ravel()
+        npoints = len( uflat )
+        
+
+        # transformation of one chunk
+        uout = np.empty( npoints )
+        vout = np.empty( npoints )
+
+        def transform_chunk( i1 ):
+
+                i2 = min( i1 + chunk_size, npoints )
+
+                if backend == 'numpy' and inverse:
+                        uc, vc = geos_inverse( uflat[i1:i2], vflat[i1:i2], lon0 = lon0 )
+                elif backend == 'numpy':
+                        uc, vc = geos_forward( uflat[i1:i2], vflat[i1:i2], lon0 = lon0 )
+                else:
+                        msevi_proj = get_msevi_proj( lon0 = lon0 )
+                        uc, vc = msevi_proj( uflat[i1:i2], vflat[i1:i2], inverse = inverse )
+
+                uout[i1:i2] = uc
+                vout[i1:i2] = vc
+
+                return
+
+
+        # chunk loop
+        chunk_starts = range( 0, npoints, chunk_size )
+
+        if nworkers > 1 and npoints > chunk_size:
+                with concurrent.futures.ThreadPoolExecutor( max_workers = nworkers ) as executor:
+                        list( executor.map( transform_chunk, chunk_starts ) )
+        else:
+                for i1 in chunk_starts:
+                        transform_chunk( i1 )
+
+        return uout.reshape( u.shape ), vout.reshape( v.shape )
+
+
+######################################################################
+######################################################################
+
+
+def msevi_ll2xy(lon, lat, lon0 = 0, backend = 'pyproj', nworkers = 4):
         
         ''' 
         Returns line/column numbers in geostationary satellite
@@ -84,6 +378,11 @@ def msevi_ll2xy(lon, lat, lon0 = 0):
         lon0 : float, optional, default = 0
             sub-satellite longitude
 
+        backend : str, optional, default = 'pyproj'
+            projection backend, 'pyproj' or 'numpy' (see `msevi_transform`)
+
+        nworkers : int, optional, default = 4
+            number of worker threads for large inputs
         
         
         Returns
@@ -95,24 +394,12 @@ def msevi_ll2xy(lon, lat, lon0 = 0):
             y-coordinate in SEVIRI projection
 
         '''
-        geos_proj_param = {
-                'proj':      'geos',
-                'h':     35785831.0,
-                'a':      6378169.0,
-                'b':      6356583.8,
-                'lon_0':        lon0
-        }
-        # 
         assert lat.shape==lon.shape
         
         # Apply MSG SEVIRI satellite projection
-        msevi_proj = pyproj.Proj(**geos_proj_param)
-        
-        
-        (x, y) = msevi_proj(lon.flatten(),lat.flatten())
-
-        x = x.reshape(*lon.shape)
-        y = y.reshape(*lat.shape)
+        (x, y) = msevi_transform(lon, lat, lon0 = lon0, 
+                                 backend = backend, 
+                                 nworkers = nworkers)
         
         return x, y
 
@@ -159,8 +446,7 @@ def msevi_xy2ij(x, y, hres = False):
                 icol = x / res + (3*1856.0)
                 irow = (3*1856.0) - y / res
 
-        irow.shape = icol.shape = y.shape
-        
+        # x and y might also be broadcastable vectors (no reshape)
         return irow, icol
 
 ######################################################################
@@ -203,10 +489,9 @@ def msevi_ij2xy(irow, icol, hres = False):
             res = 1000.1343886066667
             offset = (3*1856.0)
             
+        # irow and icol might also be broadcastable vectors
         x = res * (icol - offset)
         y = res * (offset - irow)
-
-        x.shape = y.shape = irow.shape
         
         return x,y
 
@@ -215,7 +500,7 @@ def msevi_ij2xy(irow, icol, hres = False):
 ######################################################################
 
 
-def msevi_ij2ll(irow, icol, lon0 = 0, hres = False):
+def msevi_ij2ll(irow, icol, lon0 = 0, hres = False, backend = 'pyproj', nworkers = 4):
         
         '''
         Converts msevi indices into xy coordinates.
@@ -235,6 +520,12 @@ def msevi_ij2ll(irow, icol, lon0 = 0, hres = False):
         hres : bool, optional, default = False
             switch if resolution coordiante have been input
 
+        backend : str, optional, default = 'pyproj'
+            projection backend, 'pyproj' or 'numpy' (see `msevi_transform`)
+
+        nworkers : int, optional, default = 4
+            number of worker threads for large inputs
+
 
         Returns
         -------
@@ -250,9 +541,11 @@ def msevi_ij2ll(irow, icol, lon0 = 0, hres = False):
         x, y = msevi_ij2xy(irow, icol, hres = hres)
 
         
-        # set up projection
-        msevi_proj = set_msevi_proj(lon0 = lon0)
-        lon, lat = msevi_proj(x, y, inverse = True)
+        # apply inverse projection
+        lon, lat = msevi_transform(x, y, lon0 = lon0, 
+                                   inverse = True,
+                                   backend = backend,
+                                   nworkers = nworkers)
 
         
         return lon, lat
@@ -260,10 +553,12 @@ def msevi_ij2ll(irow, icol, lon0 = 0, hres = False):
 ######################################################################
 ######################################################################
 
-def msevi_lonlat(region = SEVIRI_cutout, return_azi_zen = False):
+def msevi_region_index(region = SEVIRI_cutout, hres = False, sparse = False):
 
     '''
-    Calcualtions MSG longitude and latitude for a certain cutout.
+    Row and column indices of a SEVIRI cutout.
+
+    Only the requested window is allocated (not the full disk).
 
 
     Parameters
@@ -271,101 +566,271 @@ def msevi_lonlat(region = SEVIRI_cutout, return_azi_zen = False):
     region : tuble of int, optional, default = SEVIRI_cutout
         cutout region defintion as ((ir1, ir2), (ic1, ic2))
 
-    return_azi_zen : bool, optional, default = False
-        switch if satellite azimuth and zenith angle is calculated and returned
+    hres : bool, optional, default = False
+        switch if region is given in high resolution (HRV) indices
+
+    sparse : bool, optional, default = False
+        if True, broadcastable index vectors with shape (nrows, 1) and 
+        (1, ncols) are returned
 
 
     Returns
     --------
-    vgeo : dict of numpy arrays
-        georeference dictionary
-    '''
-
-    
-    # prepare index field
-    nmax = 3712
-
-    irow_all, icol_all = gi.make_index_set( nmax, nmax )
-    irow = gi.cutout_fields( irow_all, region )
-    icol = gi.cutout_fields( icol_all, region )
+    irow : numpy array
+        row index in SEVIRI projection
 
+    icol : numpy array
+        column index in SEVIRI projection
+    '''
 
-    # and use geo-stationary projection
-    lon, lat = msevi_ij2ll(irow, icol)
+    # full disk size
+    if hres:
+        nmax = 3 * 3712
+    else:
+        nmax = 3712
 
-    vgeo = dict( lon = lon, lat = lat )
+    (ir1, ir2), (ic1, ic2) = region
 
-    if return_azi_zen:
-        azi, zen = lonlat2azizen(lon, lat)
-        vgeo['azi'] = azi
-        vgeo['zen'] = zen
+    irow, icol = np.meshgrid( np.arange( ir1, min( ir2, nmax ) ), 
+                              np.arange( ic1, min( ic2, nmax ) ),
+                              indexing = 'ij',
+                              sparse = sparse )
 
-    return vgeo
+    return irow, icol
 
 
 ######################################################################
 ######################################################################
 
-def slice2nwcsaf_region(region):
-    
+
+def msevi_region_xy(region = SEVIRI_cutout, hres = False, sparse = False):
+
     '''
-    Function that gets the NWCSAF region definition from a region slice (row1, row2), (col1, col2).
-    
-    
+    Projection co-ordinates of a SEVIRI cutout.
+
+
     Parameters
     ----------
-    region : tuple of tuples of int
-        region slice (row1, row2), (col1, col2)
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    hres : bool, optional, default = False
+        switch if region is given in high resolution (HRV) indices
+
+    sparse : bool, optional, default = False
+        if True, broadcastable co-ordinate vectors with shape (1, ncols) for x 
+        and (nrows, 1) for y are returned
 
 
     Returns
-    -------
-    icenter : tuple of int
-        center index of the region cutout 
-    
-    ndims : tuple of int
-        dimensions ( size ) of the region (nrows, ncols)
+    --------
+    x : numpy array
+        x-coordinate in SEVIRI projection
         
+    y : numpy array
+        y-coordinate in SEVIRI projection
     '''
-    
-    
-    # get sizes
-    rowsize = region[0][1] - region[0][0]
-    colsize = region[1][1] - region[1][0]
-    
-    ndims = rowsize, colsize
-    
-    
-    # centerindex
-    crow =  region[0][0] + rowsize / 2 + 1
-    ccol =  region[1][0] + colsize / 2 + 1
-    
-    icenter = crow, ccol
-    
-    return icenter, ndims
+
+    irow, icol = msevi_region_index( region = region, hres = hres, sparse = sparse )
+
+    return msevi_ij2xy( irow, icol, hres = hres )
+
 
 ######################################################################
 ######################################################################
 
-def nwcsaf_region2slice(icenter, ndims):
+# store of Msevi georeferences (shared, read-only)
+msevi_georef_store = {}
+msevi_georef_lock = threading.Lock()
+
+
+def calc_msevi_lonlat(region = SEVIRI_cutout, return_azi_zen = False, hres = False):
 
     '''
-    The region defintion of the NWCSAF (based on size and center coordinates)
-    is converted to a region slice.
- 
+    Calculates MSG longitude and latitude for a certain cutout.
+
 
-    
     Parameters
     ----------
-    icenter : tuple of int
-        center index of the region cutout 
-    
-    ndims : tuple of int
-        dimensions ( size ) of the region (nrows, ncols)
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    return_azi_zen : bool, optional, default = False
+        switch if satellite azimuth and zenith angle is calculated and returned
+
+    hres : bool, optional, default = False
+        switch if region is given in high resolution (HRV) indices
 
 
     Returns
-    -------
+    --------
+    vgeo : dict of numpy arrays
+        georeference dictionary
+    '''
+
+    
+    # prepare index field (only for the cutout)
+    irow, icol = msevi_region_index( region = region, hres = hres )
+
+
+    # and use geo-stationary projection
+    lon, lat = msevi_ij2ll(irow, icol, hres = hres)
+
+    vgeo = dict( lon = lon, lat = lat )
+
+    if return_azi_zen:
+        azi, zen = get_viewing_geometry( lon, lat, key = ('msevi_lonlat', region, hres) )
+        vgeo['azi'] = azi
+        vgeo['zen'] = zen
+
+    return vgeo
+
+
+######################################################################
+######################################################################
+
+def msevi_lonlat(region = SEVIRI_cutout, return_azi_zen = False, 
+                 hres = False, 
+                 use_store = True, 
+                 store_dir = None):
+
+    '''
+    Calcualtions MSG longitude and latitude for a certain cutout.
+
+    Georeferences are computed only once per region and resolution and kept 
+    in a module-level store. The returned arrays are shared and read-only.
+
+
+    Parameters
+    ----------
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    return_azi_zen : bool, optional, default = False
+        switch if satellite azimuth and zenith angle is calculated and returned
+
+    hres : bool, optional, default = False
+        switch if region is given in high resolution (HRV) indices
+
+    use_store : bool, optional, default = True
+        switch if georef store is used, if False arrays are re-calculated
+
+    store_dir : str, optional, default = None
+        if set, the georef is also kept as memory-mapped file under this 
+        directory (shared between processes and sessions)
+
+
+    Returns
+    --------
+    vgeo : dict of numpy arrays
+        georeference dictionary
+    '''
+
+    if not use_store:
+        return calc_msevi_lonlat( region = region, return_azi_zen = return_azi_zen, hres = hres )
+
+
+    # store key ......................................................
+    (ir1, ir2), (ic1, ic2) = region
+    key = ( (int(ir1), int(ir2)), (int(ic1), int(ic2)), bool(hres) )
+
+    vnames = ['lon', 'lat']
+    if return_azi_zen:
+        vnames += ['azi', 'zen']
+    # ================================================================
+
+
+    with msevi_georef_lock:
+
+        vgeo = msevi_georef_store.get( key, {} )
+
+        if not set( vnames ) <= set( vgeo ):
+
+            if store_dir is not None:
+                cdir = '%s/msevi_georef/rows%d-%d_cols%d-%d_%s' % ( store_dir, ir1, ir2, ic1, ic2,
+                                                                    'hres' if hres else 'lres' )
+                if not os.path.isdir( cdir ):
+                    save_array_cache( cdir, calc_msevi_lonlat( region = region, 
+                                                               return_azi_zen = True,
+                                                               hres = hres ) )
+                vgeo = load_array_cache( cdir )
+
+            else:
+                vgeo = calc_msevi_lonlat( region = region, 
+                                          return_azi_zen = return_azi_zen, 
+                                          hres = hres )
+
+            for k in vgeo:
+                vgeo[k].flags.writeable = False
+
+            msevi_georef_store[key] = vgeo
+
+    return dict( [ (k, vgeo[k]) for k in vnames ] )
+
+
+######################################################################
+######################################################################
+
+def slice2nwcsaf_region(region):
+    
+    '''
+    Function that gets the NWCSAF region definition from a region slice (row1, row2), (col1, col2).
+    
+    
+    Parameters
+    ----------
+    region : tuple of tuples of int
+        region slice (row1, row2), (col1, col2)
+
+
+    Returns
+    -------
+    icenter : tuple of int
+        center index of the region cutout 
+    
+    ndims : tuple of int
+        dimensions ( size ) of the region (nrows, ncols)
+        
+    '''
+    
+    
+    # get sizes
+    rowsize = region[0][1] - region[0][0]
+    colsize = region[1][1] - region[1][0]
+    
+    ndims = rowsize, colsize
+    
+    
+    # centerindex
+    crow =  region[0][0] + rowsize / 2 + 1
+    ccol =  region[1][0] + colsize / 2 + 1
+    
+    icenter = crow, ccol
+    
+    return icenter, ndims
+
+######################################################################
+######################################################################
+
+def nwcsaf_region2slice(icenter, ndims):
+
+    '''
+    The region defintion of the NWCSAF (based on size and center coordinates)
+    is converted to a region slice.
+ 
+
+    
+    Parameters
+    ----------
+    icenter : tuple of int
+        center index of the region cutout 
+    
+    ndims : tuple of int
+        dimensions ( size ) of the region (nrows, ncols)
+
+
+    Returns
+    -------
     region : tuple of tuples of int
         region slice (row1, row2), (col1, col2)
 
@@ -394,7 +859,10 @@ def nwcsaf_region2slice(icenter, ndims):
 ######################################################################
 
 
-def get_vector2msevi_index( vgeo, region = SEVIRI_cutout ):
+def get_vector2msevi_index( vgeo, region = SEVIRI_cutout, 
+                            method = 'tropy', 
+                            max_distance = None,
+                            nworkers = -1 ):
 
     '''
     Calculates nearest neighbor index for the conversion between 
@@ -406,6 +874,24 @@ def get_vector2msevi_index( vgeo, region = SEVIRI_cutout ):
     vgeo : dict of numpy arrays
         set of fields containing vector geo-reference
       
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    method : str, optional, default = 'tropy'
+        nn search backend, either
+
+        * 'tropy': uses `create_interpolation_index` from tropy
+        * 'kdtree': uses `scipy.spatial.cKDTree` with parallel queries
+
+    max_distance : float, optional, default = None
+        maximum distance (in m of SEVIRI projection) between pixel and ICON
+        cell, pixels without ICON cell in this distance get index -1
+        (only used for method = 'kdtree')
+
+    nworkers : int, optional, default = -1
+        number of worker threads for kdtree queries, -1 uses all cores
+        (only used for method = 'kdtree')
+
 
     Returns
     --------
@@ -413,16 +899,8 @@ def get_vector2msevi_index( vgeo, region = SEVIRI_cutout ):
         index for nn interpolation
     '''
 
-    # prepare target fields ..........................................
-    nmax = 3712
-
-    irow_all, icol_all = gi.make_index_set( nmax, nmax )
-    irow = gi.cutout_fields( irow_all, region)
-    icol = gi.cutout_fields( icol_all, region)
-
-
-    # and projection co-ordinates
-    xsevi, ysevi = msevi_ij2xy(irow, icol)
+    # prepare target fields (projection co-ordinates of cutout) ........
+    xsevi, ysevi = msevi_region_xy( region = region )
     
 
 
@@ -436,15 +914,81 @@ def get_vector2msevi_index( vgeo, region = SEVIRI_cutout ):
     
 
     # use tool for nn interpolation ..................................
-    ind = gi.create_interpolation_index(xsim, ysim, xsevi, ysevi, xy = True)
+    if method == 'tropy':
+        ind = gi.create_interpolation_index(xsim, ysim, xsevi, ysevi, xy = True)
     
+        return ind[1] # go back to vector representation
+
+    elif method == 'kdtree':
+        return kdtree_nn_index( xsim.flatten(), ysim.flatten(), xsevi, ysevi,
+                                max_distance = max_distance,
+                                nworkers = nworkers )
+
+    else:
+        raise ValueError('method %s not available for nn index calculation' % method)
+
+######################################################################
+######################################################################
+
+def kdtree_nn_index( xsim, ysim, xsevi, ysevi, max_distance = None, nworkers = -1 ):
+
+    '''
+    Nearest neighbor index between ICON vectors and SEVIRI pixels 
+    based on a kd-tree.
+
+
+    Parameters
+    ----------
+    xsim : numpy array, 1dim
+        x-coordinate of ICON cells in SEVIRI projection
+
+    ysim : numpy array, 1dim
+        y-coordinate of ICON cells in SEVIRI projection
+
+    xsevi : numpy array, 2dim
+        x-coordinate of SEVIRI pixels
+
+    ysevi : numpy array, 2dim
+        y-coordinate of SEVIRI pixels
+
+    max_distance : float, optional, default = None
+        maximum distance between pixel and ICON cell, pixels without ICON 
+        cell in this distance get index -1
+
+    nworkers : int, optional, default = -1
+        number of worker threads for queries, -1 uses all cores
+
+
+    Returns
+    --------
+    ind : numpy array, 2dim
+        index for nn interpolation (same shape as SEVIRI fields)
+    '''
+
+    # cells outside of the Meteosat disk have no valid coordinates
+    ivalid = np.nonzero( np.isfinite( xsim ) & np.isfinite( ysim ) )[0]
+
+    tree = scipy.spatial.cKDTree( np.column_stack( [xsim[ivalid], ysim[ivalid]] ) )
+
+    if max_distance is None:
+        max_distance = np.inf
 
-    return ind[1] # go back to vector representation
+    dist, itree = tree.query( np.column_stack( [xsevi.flatten(), ysevi.flatten()] ),
+                              k = 1,
+                              distance_upper_bound = max_distance,
+                              workers = nworkers )
+
+    # missing neighbors are indicated by itree == number of tree points
+    ind = - np.ones( itree.shape, dtype = np.int64 )
+    found = itree < len( ivalid )
+    ind[found] = ivalid[ itree[found] ]
+
+    return ind.reshape( xsevi.shape )
 
 ######################################################################
 ######################################################################
 
-def get_msevi2vector_index( vgeo, region = SEVIRI_cutout ):
+def get_msevi2vector_index( vgeo, region = SEVIRI_cutout, clip = True ):
 
     '''
     Calculates nearest neighbor index for the conversion between 
@@ -457,6 +1001,13 @@ def get_msevi2vector_index( vgeo, region = SEVIRI_cutout ):
     ----------
     vgeo : dict of numpy arrays
         set of fields containing vector geo-reference
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    clip : bool, optional, default = True
+        if True, index is clipped to the region boundaries, 
+        else vectors outside the region get index -1
       
 
     Returns
@@ -491,8 +1042,13 @@ def get_msevi2vector_index( vgeo, region = SEVIRI_cutout ):
     icol=  (np.round(icol_full) - ic1).astype(np.int)
     
     #and clip index range
-    irow = np.clip(irow, 0, nrows - 1)
-    icol = np.clip(icol, 0, ncols - 1)
+    if clip:
+        irow = np.clip(irow, 0, nrows - 1)
+        icol = np.clip(icol, 0, ncols - 1)
+    else:
+        outside = (irow < 0) | (irow >= nrows) | (icol < 0) | (icol >= ncols)
+        irow[outside] = -1
+        icol[outside] = -1
        
     return irow, icol
 
@@ -501,8 +1057,53 @@ def get_msevi2vector_index( vgeo, region = SEVIRI_cutout ):
 ######################################################################
 
 
+def stack_variables( dset, vlist ):
+
+    '''
+    Stacks a set of variable vectors or fields into one array.
+
+
+    Parameters
+    ----------
+    dset : dict of numpy arrays
+        set of fields
+
+    vlist : list of str
+        list of variable names to be stacked
+
+
+    Returns
+    --------
+    fstack : numpy array or None
+        stacked fields with shape (nvar, ...), variable axis is first axis
+
+        None is returned if the fields do not share shape and data type.
+    '''
+
+    flist = [ dset[vname] for vname in vlist ]
+
+    if len( flist ) == 0:
+        return None
+
+    # only stack fields of the same kind (output is then unchanged)
+    shapes = set( [ np.shape( f ) for f in flist ] )
+    dtypes = set( [ np.asarray( f ).dtype for f in flist ] )
+
+    if len( shapes ) > 1 or len( dtypes ) > 1:
+        return None
+
+    if np.any( [ np.ma.isMaskedArray( f ) for f in flist ] ):
+        return np.ma.stack( flist )
+    else:
+        return np.stack( flist )
+
+######################################################################
+######################################################################
+
+
 def nn_reproj_with_index( dset, ind, 
-                          vnames = 'all', apply_mask = True, Nan = 0 ):
+                          vnames = 'all', apply_mask = True, Nan = 0,
+                          batched = True ):
 
     '''
     Reprojects data field intpo Meteosat SEVIRI projection.
@@ -515,6 +1116,7 @@ def nn_reproj_with_index( dset, ind,
 
     ind : numpy array
         interpolation index that maps the field in dset into SEVIRI grid
+        (negative values mark pixels without neighbor, these are set to Nan)
 
     vnames : string of list of strings, optional, default = 'all'
         list of variable names to be interpolated
@@ -525,6 +1127,10 @@ def nn_reproj_with_index( dset, ind,
     Nan : float
         value inserted for positions with mask == False
 
+    batched : bool, optional, default = True
+        switch if all variables are stacked and reprojected in one pass
+        (only used if variables share shape and data type)
+
 
     Returns
     --------
@@ -535,8 +1141,7 @@ def nn_reproj_with_index( dset, ind,
 
     # prepare masking
     if apply_mask:
-        mask = hio.read_var_from_hdf( nawdex_regions_file, 'full_region' )
-        mask = mask.astype( np.bool ) 
+        mask = region_masks.get_region_mask( 'full_region' )
 
     # prepare variable list
     if vnames == 'all':
@@ -548,11 +1153,39 @@ def nn_reproj_with_index( dset, ind,
     else:
         vlist = vnames
         
-        
+
+    # missing neighbors are marked with negative index
+    ind_missing = ind < 0
+    if not ind_missing.any():
+        ind_missing = None
+
+    # stack variables for batched reprojection
+    if batched and len( vlist ) > 1:
+        fstack = stack_variables( dset, vlist )
+    else:
+        fstack = None
 
     # apply interpolation index
     dset_inter = {}
     
+    if fstack is not None:
+
+        # do interpolation for all variables at once
+        vstack = fstack[:, ind]
+
+        # apply masking if wanted
+        if apply_mask:
+            vstack = np.where( mask, vstack, Nan )
+
+        if ind_missing is not None:
+            vstack = np.where( ind_missing, Nan, vstack )
+
+        for n, vname in enumerate( vlist ):
+            dset_inter[vname] = vstack[n]
+
+        return dset_inter
+
+
     for vname in vlist:
         
         # do interpolation
@@ -562,6 +1195,9 @@ def nn_reproj_with_index( dset, ind,
         # apply masking if wanted
         if apply_mask:
             v = np.where( mask, v, Nan )
+
+        if ind_missing is not None:
+            v = np.where( ind_missing, Nan, v )
         
         dset_inter[vname] = v[:]
         
@@ -650,23 +1286,116 @@ def get_reproj_param(lin, col, region,
 ######################################################################
 ######################################################################
 
+# operators that are evaluated with segmented reductions
+segment_operators = {np.mean : 'mean',
+                     np.nanmean : 'nanmean',
+                     np.sum : 'sum',
+                     np.std : 'std',
+                     np.min : 'min',
+                     np.max : 'max',
+                     len : 'count'}
+
+
+def segment_reduce(f, rparam, operator = 'mean'):
+
+    '''
+    Segmented reduction of sorted field values onto the target grid boxes.
+
+    All values that fall into the same grid box form one contiguous segment
+    (described by `ifirst` and `count` in the reprojection parameters). Instead
+    of calling the operator once per grid box, segments of equal length are
+    gathered into a 2dim block and reduced along the last axis. The results
+    are therefore identical to a per-box call of the numpy operator.
+
+
+    Parameters
+    ----------
+    f : numpy array
+        field values, already masked with `regmask` and sorted with `isort`
+        (segments are expected along the last axis)
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+
+    operator : str or numpy method, optional, default = 'mean'
+        reduction operator, either one of 'mean', 'nanmean', 'sum', 'count',
+        'min', 'max', 'std' or the corresponding numpy method
+
+
+    Returns
+    --------
+    fseg : numpy array
+        reduced values for each grid box listed in `rparam['iuniq']`
+    '''
+
+    # get operator name
+    opname = segment_operators.get( operator, operator )
+
+    ifirst = rparam['ifirst']
+    count = rparam['count']
+
+    # count and extrema do not depend on summation order
+    if opname == 'count':
+        return np.broadcast_to( count, f.shape[:-1] + count.shape ).astype( np.float64 )
+
+    elif opname in ['min', 'max'] and not np.ma.isMaskedArray( f ):
+        if len( ifirst ) == 0:
+            return np.zeros( f.shape[:-1] + (0,), dtype = f.dtype )
+
+        ufunc = dict( min = np.minimum, max = np.maximum )[opname]
+        return ufunc.reduceat( f, ifirst, axis = -1 )
+
+    elif opname not in ['mean', 'nanmean', 'sum', 'std', 'min', 'max']:
+        raise ValueError('operator %s not available for segmented reduction' % str(operator))
+
+
+    # other operators are applied on blocks of segments with equal length
+    numpy_operator = dict( mean = np.mean,
+                           nanmean = np.nanmean,
+                           sum = np.sum,
+                           std = np.std,
+                           min = np.min,
+                           max = np.max )[opname]
+
+    fseg = np.empty( f.shape[:-1] + count.shape )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') ## all-nans result in Runtime warning
+
+        for cnt in np.unique( count ):
+            iseg = np.nonzero( count == cnt )[0]
+            iblock = ifirst[iseg, np.newaxis] + np.arange( cnt )
+
+            fseg[..., iseg] = numpy_operator( f[..., iblock], axis = -1 )
+
+    return fseg
+
+######################################################################
+######################################################################
+
 
 def reproj_field(f, rparam, operator = np.nanmean):
 
     '''
     Reprojection field using reprojection parameters (and grid box avareging)
-    
-    
+
+
     Parameters
     ----------
     f : numpy array, 2dim
         field to be interpolated
 
+        A stack of fields with additional leading axis (e.g. variables or time)
+        is reprojected in one pass.
+
     rparam : dict of numpy arrays
         reprojection parameters
 
     operator : numpy method, optional, default = np.nanmean
-        operator used for calculations, e.g. averaging         
+        operator used for calculations, e.g. averaging
+
+        Operators listed in `segment_operators` (or their names) use vectorized
+        segmented reductions, all other operators are called per grid box.
 
 
     Returns
@@ -674,29 +1403,36 @@ def reproj_field(f, rparam, operator = np.nanmean):
     f_reproj
     '''
 
+    # leading stack dimensions
+    nstack = f.shape[:f.ndim - rparam['regmask'].ndim]
+
     # Mask for out-of-region pixels
-    f = f[rparam['regmask']].flatten()
+    f = f[..., rparam['regmask']]
 
     # Sort by flat index
-    f = f[rparam['isort']]
+    f = f[..., rparam['isort']]
 
     # Create new field
-    newf = np.empty(rparam['nlin']*rparam['ncol'])
+    newf = np.empty(nstack + (rparam['nlin']*rparam['ncol'],))
     newf[:] = np.nan
 
-    # # Calculate mean through cumulative sum/vectorized ##
-    # cumsum = np.cumsum(f)[para['ilast']]
-    # cumsum = np.append((cumsum[0],np.diff(cumsum)))
-    # mean = cumsum/para['count']
-    # newf[para['iuniq']]=mean
-    # # Calculate mean by for-loop
     warnings.filterwarnings('ignore') ## all-nans result in Runtime warning
 
-    for i,j,cnt in zip(rparam['iuniq'],rparam['ifirst'],rparam['count']):
-        newf[i] = operator(f[j:(j+cnt)])
+    if operator in segment_operators or operator in segment_operators.values():
+        # Calculate by segmented reduction (vectorized)
+        newf[..., rparam['iuniq']] = segment_reduce(f, rparam, operator = operator)
+
+    else:
+        # Calculate by for-loop
+        fflat = f.reshape( (-1, f.shape[-1]) )
+        newflat = newf.reshape( (-1, newf.shape[-1]) )
+
+        for fn, newfn in zip(fflat, newflat):
+            for i,j,cnt in zip(rparam['iuniq'],rparam['ifirst'],rparam['count']):
+                newfn[i] = operator(fn[j:(j+cnt)])
 
 
-    f_reproj = newf.reshape((rparam['nlin'],rparam['ncol']))
+    f_reproj = newf.reshape(nstack + (rparam['nlin'],rparam['ncol']))
 
 
     # ... and return
@@ -749,7 +1485,8 @@ def combined_reprojection( dset, ind, rparam,
                            vnames = 'all', 
                            apply_mask = True, 
                            only_apply_nn = False,
-                           Nan = 0 ):
+                           Nan = 0,
+                           batched = True ):
 
     '''
     Combine nearest neighbor (nn) and box-average interpolation. If a grid box has no value, 
@@ -779,6 +1516,11 @@ def combined_reprojection( dset, ind, rparam,
     Nan : float
         value inserted for positions with mask == False
 
+    batched : bool, optional, default = True
+        switch if all variables are stacked into one (nvar, ncell) array and
+        reprojected in a single pass (only used if variables share shape and 
+        data type)
+
 
     Returns
     --------
@@ -792,7 +1534,8 @@ def combined_reprojection( dset, ind, rparam,
     dset_nn = nn_reproj_with_index( dset, ind, 
                                     vnames = vnames, 
                                     apply_mask = apply_mask, 
-                                    Nan = Nan )
+                                    Nan = Nan,
+                                    batched = batched )
 
 
     # LLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLLL
@@ -801,9 +1544,36 @@ def combined_reprojection( dset, ind, rparam,
     
     vlist = list(dset_nn.keys())
 
+    # stack variables for batched reprojection
+    if batched and len( vlist ) > 1:
+        fstack = stack_variables( dset, vlist )
+    else:
+        fstack = None
+
     # apply interpolation index
     dset_inter = {}
-    
+
+    if fstack is not None:
+
+        # get nn result
+        fnn = np.stack( [ dset_nn[vname] for vname in vlist ] )
+
+        # do averaging interpolation for all variables at once
+        if not only_apply_nn:
+            fave = reproj_field( fstack, rparam, operator = np.mean )
+        else:
+            fave = np.nan * np.ma.ones_like( fnn )
+            fave = np.ma.masked_invalid( fave )
+
+        # take nn where ave is not defined
+        f_inter = np.where( fave.mask, fnn, fave )
+
+        for n, vname in enumerate( vlist ):
+            dset_inter[vname] = np.ma.masked_equal( f_inter[n], Nan )
+
+        return dset_inter
+
+    
     for vname in vlist:
         
         # get field vector
@@ -829,3 +1599,1037 @@ def combined_reprojection( dset, ind, rparam,
 
 ######################################################################
 ######################################################################
+
+######################################################################
+# (4) Persistent Cache for Reprojection Index and Parameters
+######################################################################
+
+
+def reproj_cache_key( gridfile, region = SEVIRI_cutout, zen_max = 75., **kwargs ):
+
+    '''
+    Generates a key for cached reprojection index and parameters.
+
+    The key changes if the grid file, the region, the zenith limit or the 
+    code version is changed.
+
+
+    Parameters
+    ----------
+    gridfile : str
+        name of ICON grid file
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle used for ICON vectors
+
+    **kwargs : dict
+        further settings that change the reprojection result
+
+
+    Returns
+    --------
+    key : str
+        hash key
+    '''
+
+    fstat = os.stat( gridfile )
+
+    key_param = dict( gridfile = os.path.abspath( gridfile ),
+                      mtime = fstat.st_mtime,
+                      size = fstat.st_size,
+                      region = np.array( region ).tolist(),
+                      zen_max = float( zen_max ),
+                      version = __version__ )
+    key_param.update( kwargs )
+
+    key_string = json.dumps( key_param, sort_keys = True, default = str )
+
+    return hashlib.sha1( key_string.encode('utf-8') ).hexdigest()
+
+######################################################################
+######################################################################
+
+
+def save_array_cache( cdir, arrays ):
+
+    '''
+    Saves a set of arrays into a cache directory.
+
+    Each array is stored as separate npy file to allow memory mapping. The 
+    directory is written in a temporary place first and renamed afterwards,
+    i.e. concurrent workers never see partial caches.
+
+
+    Parameters
+    ----------
+    cdir : str
+        name of cache directory
+
+    arrays : dict of numpy arrays
+        set of arrays (or scalars) to be saved
+
+
+    Returns
+    --------
+    None
+    '''
+
+    basedir = os.path.dirname( os.path.abspath( cdir ) )
+    if not os.path.isdir( basedir ):
+        os.makedirs( basedir )
+
+    tmpdir = tempfile.mkdtemp( dir = basedir )
+
+    for k in arrays:
+        np.save( '%s/%s.npy' % (tmpdir, k), arrays[k] )
+
+    try:
+        os.rename( tmpdir, cdir )
+    except OSError:
+        # other process has been faster
+        shutil.rmtree( tmpdir, ignore_errors = True )
+
+    return
+
+######################################################################
+######################################################################
+
+
+def load_array_cache( cdir, mmap_mode = 'r' ):
+
+    '''
+    Loads a set of arrays from a cache directory.
+
+
+    Parameters
+    ----------
+    cdir : str
+        name of cache directory
+
+    mmap_mode : str, optional, default = 'r'
+        memory-map mode passed to `numpy.load`
+
+
+    Returns
+    --------
+    arrays : dict of numpy arrays
+        set of arrays, scalars are returned as python numbers
+    '''
+
+    arrays = {}
+    for fname in sorted( os.listdir( cdir ) ):
+        if fname.endswith( '.npy' ):
+            k = fname[:-len('.npy')]
+            v = np.load( '%s/%s' % (cdir, fname), mmap_mode = mmap_mode )
+
+            if np.ndim( v ) == 0:
+                v = v.item()
+
+            arrays[k] = v
+
+    return arrays
+
+######################################################################
+######################################################################
+
+
+def save_reproj_cache( cdir, ind, rparam ):
+
+    '''
+    Saves reprojection index and parameters into a cache directory.
+
+
+    Parameters
+    ----------
+    cdir : str
+        name of cache directory
+
+    ind : numpy array
+        index for nn interpolation
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+
+
+    Returns
+    --------
+    None
+    '''
+
+    arrays = dict( ind = ind )
+    for k in rparam:
+        arrays['rparam_%s' % k] = rparam[k]
+
+    save_array_cache( cdir, arrays )
+
+    return
+
+######################################################################
+######################################################################
+
+
+def load_reproj_cache( cdir, mmap_mode = 'r' ):
+
+    '''
+    Loads reprojection index and parameters from a cache directory.
+
+
+    Parameters
+    ----------
+    cdir : str
+        name of cache directory
+
+    mmap_mode : str, optional, default = 'r'
+        memory-map mode passed to `numpy.load`
+
+
+    Returns
+    --------
+    ind : numpy array
+        index for nn interpolation
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+    '''
+
+    arrays = load_array_cache( cdir, mmap_mode = mmap_mode )
+
+    ind = arrays['ind']
+
+    rparam = {}
+    for k in arrays:
+        if k.startswith( 'rparam_' ):
+            rparam[k[len('rparam_'):]] = arrays[k]
+
+    return ind, rparam
+
+######################################################################
+######################################################################
+
+
+def get_cached_vector2msevi_reproj( vgeo, gridfile, 
+                                    region = SEVIRI_cutout, 
+                                    zen_max = 75.,
+                                    cache_dir = cache_dir,
+                                    index_kwargs = {} ):
+
+    '''
+    Returns nn index and reprojection parameters for the conversion between
+    ICON output vectors and the Msevi grid using a persistent cache.
+
+    The cache key includes the number and the content of the vector 
+    georef (e.g. zenith-masked and unmasked vectors use different caches).
+    If no valid cache exists, index and parameters are calculated with
+    `get_vector2msevi_index` and `get_vector2msevi_rparam` and saved.
+
+
+    Parameters
+    ----------
+    vgeo : dict of numpy arrays
+        set of fields containing vector geo-reference
+
+    gridfile : str
+        name of ICON grid file
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    zen_max : float, optional, default = 75
+        maximum in satellite zenith angle used for ICON vectors
+
+    cache_dir : str, optional, default = cache_dir (from config)
+        base directory of cache files
+
+    index_kwargs : dict, optional, default = {}
+        keywords passed to `get_vector2msevi_index` (e.g. method, max_distance)
+
+
+    Returns
+    --------
+    ind : numpy array
+        index for nn interpolation
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+    '''
+
+    # worker number does not change the result
+    key_kwargs = dict( [ (k, v) for k, v in index_kwargs.items() if k != 'nworkers' ] )
+
+    # vector georef (incl. its mask) is part of the key
+    key_kwargs['nvec'] = int( np.size( vgeo['lon'] ) )
+    key_kwargs['georef'] = grid_key( vgeo['lon'], vgeo['lat'] )[1]
+    key_kwargs['georef_mask'] = hashlib.sha1( np.packbits( np.ma.getmaskarray( vgeo['lon'] ) | 
+                                                           np.ma.getmaskarray( vgeo['lat'] ) ) ).hexdigest()
+
+    key = reproj_cache_key( gridfile, region = region, zen_max = zen_max, **key_kwargs )
+    cdir = '%s/reproj/%s' % (cache_dir, key)
+
+    # try to use cache (an inconsistent cache is treated as a miss, shared
+    # cache directories are never removed as other workers may map them)
+    if os.path.isdir( cdir ):
+        ind, rparam = load_reproj_cache( cdir )
+
+        if np.shape( rparam['regmask'] ) == np.shape( vgeo['lon'] ):
+            return ind, rparam
+
+
+    # calculate and save
+    ind = get_vector2msevi_index( vgeo, region = region, **index_kwargs )
+    rparam = get_vector2msevi_rparam( vgeo, region = region )
+
+    try:
+        save_reproj_cache( cdir, ind, rparam )
+    except (IOError, OSError) as err:
+        warnings.warn( 'reprojection cache could not be written: %s' % str(err) )
+
+    return ind, rparam
+
+######################################################################
+######################################################################
+
+######################################################################
+# (5) Sparse-Matrix Reprojection Operator
+######################################################################
+
+
+def csr_from_rows( rows, cols, weights, shape ):
+
+    '''
+    Builds a sparse CSR matrix from row / column indices and weights.
+
+    In contrast to the COO-based constructor, the column order within each 
+    row is kept as given. Hence, row sums are evaluated in the same order as
+    in the box-averaging.
+
+
+    Parameters
+    ----------
+    rows : numpy array, 1dim
+        row indices
+
+    cols : numpy array, 1dim
+        column indices
+
+    weights : numpy array, 1dim
+        matrix entries
+
+    shape : tuple of int
+        matrix shape (nrows, ncols)
+
+
+    Returns
+    --------
+    matrix : scipy.sparse.csr_matrix
+        sparse matrix
+    '''
+
+    isort = np.argsort( rows, kind = 'stable' )
+
+    indptr = np.zeros( shape[0] + 1, dtype = np.int64 )
+    indptr[1:] = np.cumsum( np.bincount( rows, minlength = shape[0] ) )
+
+    matrix = scipy.sparse.csr_matrix( (weights[isort], cols[isort], indptr), shape = shape )
+
+    return matrix
+
+######################################################################
+######################################################################
+
+
+def get_reproj_operator( ind, rparam, 
+                         apply_mask = True, 
+                         only_apply_nn = False ):
+
+    '''
+    Converts nn index and reprojection parameters into a sparse-matrix 
+    operator that maps ICON vectors onto the SEVIRI grid.
+
+    Grid boxes that contain ICON cells get the box average, all other grid
+    boxes get the nn value (as in `combined_reprojection`). Results agree
+    with `combined_reprojection` only for unmasked, finite input vectors 
+    (see `apply_reproj_operator`).
+
+
+    Parameters
+    ----------
+    ind : numpy array
+        interpolation index that maps the field in dset into SEVIRI grid
+
+    rparam : dict of numpy arrays
+        reprojection parameters
+
+    apply_mask : bool, optional, default = True
+        switch if nn values are restricted to the domain mask
+
+    only_apply_nn : bool, optional, default = False
+        switch if only nearest neighbor interpolation is applied
+
+
+    Returns
+    --------
+    roperator : dict
+        reprojection operator with
+
+        * 'matrix': scipy.sparse.csr_matrix with weights, shape (npix, ncell)
+        * 'norm': sum of weights for each pixel, zero for pixels without value
+        * 'nlin', 'ncol': shape of SEVIRI grid
+    '''
+
+    nlin, ncol = rparam['nlin'], rparam['ncol']
+    npix = nlin * ncol
+    ncell = np.size( rparam['regmask'] )
+
+    rows = []
+    cols = []
+
+    # box-average rows ...............................................
+    has_box = np.zeros( npix, dtype = bool )
+
+    if not only_apply_nn:
+        icell = np.nonzero( np.ravel( rparam['regmask'] ) )[0][ rparam['isort'] ]
+
+        rows += [ np.repeat( rparam['iuniq'], rparam['count'] ), ]
+        cols += [ icell, ]
+
+        has_box[ rparam['iuniq'] ] = True
+
+
+    # nn rows ........................................................
+    ind = np.ravel( ind )
+    use_nn = ~has_box & (ind >= 0)
+
+    if apply_mask:
+        mask = region_masks.get_region_mask( 'full_region' )
+        use_nn &= np.ravel( mask )
+
+    ipix_nn = np.nonzero( use_nn )[0]
+
+    rows += [ ipix_nn, ]
+    cols += [ ind[ipix_nn], ]
+
+
+    # build matrix ...................................................
+    rows = np.concatenate( rows )
+    cols = np.concatenate( cols )
+    weights = np.ones( len( rows ) )
+
+    matrix = csr_from_rows( rows, cols, weights, (npix, ncell) )
+    
+    roperator = dict( matrix = matrix,
+                      norm = np.asarray( matrix.sum( axis = 1 ) ).squeeze( axis = 1 ),
+                      nlin = nlin,
+                      ncol = ncol )
+
+    return roperator
+
+######################################################################
+######################################################################
+
+
+def apply_reproj_operator( roperator, fstack, Nan = 0 ):
+
+    '''
+    Applies sparse-matrix reprojection operator to a stack of ICON vectors.
+
+    All time steps (or variables) are reprojected with one sparse matrix 
+    product.
+
+    Input masks are ignored (only the data are used) and a NaN in a cell 
+    propagates to every pixel which uses that cell. Hence, the result only
+    equals `combined_reprojection` for unmasked, finite input vectors.
+
+
+    Parameters
+    ----------
+    roperator : dict
+        reprojection operator (see `get_reproj_operator`)
+
+    fstack : numpy array, 1dim or 2dim
+        field vector or stack of field vectors with shape (ntime, ncell)
+
+    Nan : float
+        value inserted for pixels without value
+
+
+    Returns
+    --------
+    f_reproj : numpy masked array
+        reprojected field(s) with shape (nlin, ncol) or (ntime, nlin, ncol),
+        pixels equal to Nan are masked
+    '''
+
+    f2d = np.atleast_2d( np.ma.getdata( fstack ) )
+    ntime = f2d.shape[0]
+
+    # sums are done in precision of input (as for box-averaging)
+    if np.issubdtype( f2d.dtype, np.floating ):
+        dtype = f2d.dtype
+    else:
+        dtype = np.float64
+
+    matrix = roperator['matrix'].astype( dtype )
+
+    # weighted sum for all fields at once
+    fsum = matrix.dot( f2d.T ).T
+
+    norm = roperator['norm'].astype( dtype )
+    nvalid = norm > 0
+
+    f_reproj = np.empty( (ntime, len( norm )) )
+    f_reproj[:, nvalid] = fsum[:, nvalid] / norm[nvalid]
+    f_reproj[:, ~nvalid] = Nan
+
+    f_reproj = f_reproj.reshape( (ntime, roperator['nlin'], roperator['ncol']) )
+
+    if np.ndim( fstack ) == 1:
+        f_reproj = f_reproj[0]
+
+    return np.ma.masked_equal( f_reproj, Nan )
+
+######################################################################
+######################################################################
+
+######################################################################
+# (6) Conservative Remapping
+######################################################################
+
+
+def clip_polygons( px, py, nv, bound, axis = 0, keep_greater = True ):
+
+    '''
+    Clips a set of convex polygons at an axis-parallel line 
+    (one Sutherland-Hodgman step, vectorized over all polygons).
+
+
+    Parameters
+    ----------
+    px : numpy array, 2dim
+        x-coordinates of polygon vertices with shape (npoly, nvertex_max)
+
+    py : numpy array, 2dim
+        y-coordinates of polygon vertices with shape (npoly, nvertex_max)
+
+    nv : numpy array, 1dim
+        number of valid vertices per polygon
+
+    bound : numpy array, 1dim
+        position of the clipping line per polygon
+
+    axis : int, optional, default = 0
+        0 for clipping at x = bound, 1 for clipping at y = bound
+
+    keep_greater : bool, optional, default = True
+        switch if the part with coordinates >= bound is kept
+
+
+    Returns
+    --------
+    qx : numpy array, 2dim
+        x-coordinates of clipped polygons with shape (npoly, nvertex_max + 1)
+
+    qy : numpy array, 2dim
+        y-coordinates of clipped polygons with shape (npoly, nvertex_max + 1)
+
+    nq : numpy array, 1dim
+        number of valid vertices per clipped polygon
+    '''
+
+    npoly, nmax = px.shape
+    ipoly = np.arange( npoly )
+
+    qx = np.zeros( (npoly, nmax + 1) )
+    qy = np.zeros( (npoly, nmax + 1) )
+    nq = np.zeros( npoly, dtype = np.int64 )
+
+    if axis == 0:
+        pc = px
+    else:
+        pc = py
+
+    for k in range( nmax ):
+
+        # current and next vertex of each edge
+        active = k < nv
+        knext = np.where( k + 1 < nv, k + 1, 0 )
+
+        cx, cy, cc = px[:, k], py[:, k], pc[:, k]
+        nx, ny, nc = px[ipoly, knext], py[ipoly, knext], pc[ipoly, knext]
+
+        if keep_greater:
+            cin, nin = cc >= bound, nc >= bound
+        else:
+            cin, nin = cc <= bound, nc <= bound
+
+        # keep vertex if inside
+        i = np.nonzero( active & cin )[0]
+        qx[i, nq[i]] = cx[i]
+        qy[i, nq[i]] = cy[i]
+        nq[i] += 1
+
+        # add intersection if edge crosses clipping line
+        i = np.nonzero( active & (cin != nin) )[0]
+        t = (bound[i] - cc[i]) / (nc[i] - cc[i])
+        qx[i, nq[i]] = cx[i] + t * (nx[i] - cx[i])
+        qy[i, nq[i]] = cy[i] + t * (ny[i] - cy[i])
+        nq[i] += 1
+
+    return qx, qy, nq
+
+######################################################################
+######################################################################
+
+
+def polygon_area( px, py, nv ):
+
+    '''
+    Calculates area of a set of polygons (shoelace formula).
+
+
+    Parameters
+    ----------
+    px : numpy array, 2dim
+        x-coordinates of polygon vertices with shape (npoly, nvertex_max)
+
+    py : numpy array, 2dim
+        y-coordinates of polygon vertices with shape (npoly, nvertex_max)
+
+    nv : numpy array, 1dim
+        number of valid vertices per polygon
+
+
+    Returns
+    --------
+    area : numpy array, 1dim
+        polygon areas
+    '''
+
+    npoly, nmax = px.shape
+    ipoly = np.arange( npoly )
+
+    area = np.zeros( npoly )
+
+    for k in range( nmax ):
+        active = k < nv
+        knext = np.where( k + 1 < nv, k + 1, 0 )
+
+        cross = px[:, k] * py[ipoly, knext] - px[ipoly, knext] * py[:, k]
+        area += np.where( active, cross, 0 )
+
+    return 0.5 * np.abs( area )
+
+######################################################################
+######################################################################
+
+
+def get_conservative_operator( vertex_lon, vertex_lat, region = SEVIRI_cutout,
+                               chunk_size = 2000000 ):
+
+    '''
+    Calculates a conservative (area-weighted) remapping operator between 
+    ICON triangles and SEVIRI pixels.
+
+    Triangle vertices are projected into the SEVIRI index space where each 
+    pixel is a unit square. The overlap area between each triangle and each
+    pixel is used as weight. The pixel value is the overlap-weighted average
+    over all contributing triangles, hence fluxes integrated over the area
+    are preserved (the local distortion of the projection within one pixel
+    is neglected).
+
+
+    Parameters
+    ----------
+    vertex_lon : numpy array, 2dim
+        longitudes of triangle vertices with shape (ncell, 3)
+
+    vertex_lat : numpy array, 2dim
+        latitudes of triangle vertices with shape (ncell, 3)
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    chunk_size : int, optional, default = 2000000
+        maximum number of triangle-pixel pairs processed at once
+
+
+    Returns
+    --------
+    roperator : dict
+        reprojection operator (see `get_reproj_operator`)
+    '''
+
+    (ir1, ir2), (ic1, ic2) = region
+    nlin = ir2 - ir1
+    ncol = ic2 - ic1
+
+    ncell = vertex_lon.shape[0]
+
+
+    # vertex positions in pixel units ................................
+    # (pixel (i, j) covers [i, i+1] x [j, j+1] after shift)
+    xv, yv = msevi_ll2xy( vertex_lon, vertex_lat, lon0 = 0 )
+    lin, col = msevi_xy2ij( xv, yv )
+
+    vy = lin - ir1 + 0.5
+    vx = col - ic1 + 0.5
+
+
+    # bounding box of each triangle in pixels ........................
+    valid = np.all( np.isfinite( vx ) & np.isfinite( vy ), axis = 1 )
+    vx[~valid] = -1
+    vy[~valid] = -1
+
+    c1 = np.clip( np.floor( vx.min( axis = 1 ) ).astype( np.int64 ), 0, ncol - 1 )
+    c2 = np.clip( np.floor( vx.max( axis = 1 ) ).astype( np.int64 ), 0, ncol - 1 )
+    r1 = np.clip( np.floor( vy.min( axis = 1 ) ).astype( np.int64 ), 0, nlin - 1 )
+    r2 = np.clip( np.floor( vy.max( axis = 1 ) ).astype( np.int64 ), 0, nlin - 1 )
+
+    inside = valid & (vx.max( axis = 1 ) > 0) & (vx.min( axis = 1 ) < ncol) \
+                   & (vy.max( axis = 1 ) > 0) & (vy.min( axis = 1 ) < nlin)
+
+    icells = np.nonzero( inside )[0]
+    nbox = (c2 - c1 + 1) * (r2 - r1 + 1)
+
+
+    # overlap for chunks of triangle-pixel pairs .....................
+    rows = []
+    cols = []
+    weights = []
+
+    npairs = np.cumsum( nbox[icells] )
+
+    istart = 0
+    while istart < len( icells ):
+
+        # number of pairs before this chunk
+        if istart == 0:
+            nbefore = 0
+        else:
+            nbefore = npairs[istart - 1]
+
+        iend = np.searchsorted( npairs, nbefore + chunk_size, side = 'right' )
+        iend = max( iend, istart + 1 )
+
+        cells = icells[istart:iend]
+        istart = iend
+
+        # generate all pixel in bounding boxes
+        ntri = nbox[cells]
+        icell = np.repeat( cells, ntri )
+        ilocal = np.arange( ntri.sum() ) - np.repeat( np.cumsum( ntri ) - ntri, ntri )
+        
+        width = (c2 - c1 + 1)[icell]
+        pcol = c1[icell] + ilocal % width
+        plin = r1[icell] + ilocal // width
+
+        # clip triangles at pixel boundaries
+        px, py = vx[icell], vy[icell]
+        nv = 3 * np.ones( len( icell ), dtype = np.int64 )
+
+        px, py, nv = clip_polygons( px, py, nv, pcol.astype( np.float64 ), axis = 0, keep_greater = True )
+        px, py, nv = clip_polygons( px, py, nv, pcol + 1., axis = 0, keep_greater = False )
+        px, py, nv = clip_polygons( px, py, nv, plin.astype( np.float64 ), axis = 1, keep_greater = True )
+        px, py, nv = clip_polygons( px, py, nv, plin + 1., axis = 1, keep_greater = False )
+
+        area = polygon_area( px, py, nv )
+        overlap = area > 0
+
+        rows += [ (plin * ncol + pcol)[overlap], ]
+        cols += [ icell[overlap], ]
+        weights += [ area[overlap], ]
+
+
+    # build matrix ...................................................
+    if len( rows ) > 0:
+        rows = np.concatenate( rows )
+        cols = np.concatenate( cols )
+        weights = np.concatenate( weights )
+    else:
+        rows = cols = np.zeros( 0, dtype = np.int64 )
+        weights = np.zeros( 0 )
+
+    matrix = csr_from_rows( rows, cols, weights, (nlin * ncol, ncell) )
+
+    roperator = dict( matrix = matrix,
+                      norm = np.asarray( matrix.sum( axis = 1 ) ).squeeze( axis = 1 ),
+                      nlin = nlin,
+                      ncol = ncol )
+
+    return roperator
+
+######################################################################
+######################################################################
+
+
+def save_operator_cache( cdir, roperator ):
+
+    '''
+    Saves a sparse reprojection operator into a cache directory.
+
+
+    Parameters
+    ----------
+    cdir : str
+        name of cache directory
+
+    roperator : dict
+        reprojection operator (see `get_reproj_operator`)
+
+
+    Returns
+    --------
+    None
+    '''
+
+    matrix = roperator['matrix']
+
+    arrays = dict( data = matrix.data,
+                   indices = matrix.indices,
+                   indptr = matrix.indptr,
+                   shape = np.array( matrix.shape ),
+                   norm = roperator['norm'],
+                   nlin = roperator['nlin'],
+                   ncol = roperator['ncol'] )
+
+    save_array_cache( cdir, arrays )
+
+    return
+
+######################################################################
+######################################################################
+
+
+def load_operator_cache( cdir, mmap_mode = 'r' ):
+
+    '''
+    Loads a sparse reprojection operator from a cache directory.
+
+
+    Parameters
+    ----------
+    cdir : str
+        name of cache directory
+
+    mmap_mode : str, optional, default = 'r'
+        memory-map mode passed to `numpy.load`
+
+
+    Returns
+    --------
+    roperator : dict
+        reprojection operator (see `get_reproj_operator`)
+    '''
+
+    arrays = load_array_cache( cdir, mmap_mode = mmap_mode )
+
+    matrix = scipy.sparse.csr_matrix( (arrays['data'], arrays['indices'], arrays['indptr']),
+                                      shape = tuple( arrays['shape'] ) )
+
+    roperator = dict( matrix = matrix,
+                      norm = arrays['norm'],
+                      nlin = arrays['nlin'],
+                      ncol = arrays['ncol'] )
+
+    return roperator
+
+######################################################################
+######################################################################
+######################################################################
+# (7) Aggregation of Msevi Fields onto ICON Vectors
+######################################################################
+
+
+def aggregate_msevi2vector( fstack, ind, ncell, 
+                            operator = 'mean', 
+                            fill_index = None,
+                            Nan = np.nan ):
+
+    '''
+    Aggregates Msevi fields onto ICON vectors.
+
+    Each SEVIRI pixel is assigned to its nearest ICON cell via the nn index
+    of `get_vector2msevi_index`. Per-cell means or modes are then derived
+    with one `numpy.bincount` pass per time step.
+
+    
+    Parameters
+    ----------
+    fstack : numpy array, 2dim or 3dim
+        Msevi field (nrows, ncols) or stack of fields (ntimes, nrows, ncols),
+        masked or NaN values are ignored
+
+    ind : numpy array, 2dim
+        index for nn interpolation (see `get_vector2msevi_index`),
+        negative index values are ignored
+
+    ncell : int
+        number of ICON cells
+
+    operator : str, optional, default = 'mean'
+        aggregation operator, either
+
+        * 'mean': average over all pixels of an ICON cell
+        * 'mode': most frequent value (e.g. for cloud types),
+          ties are resolved towards the smallest value
+
+    fill_index : tuple of numpy arrays, optional, default = None
+        (irow, icol) from `get_msevi2vector_index`, used to sample ICON cells 
+        that did not get any pixel assigned (e.g. for cells smaller than 
+        the SEVIRI pixel), negative index values are not filled
+
+    Nan : float, optional, default = np.nan
+        value for cells without valid data
+
+
+    Returns
+    --------
+    vstack : numpy array, 1dim or 2dim
+        aggregated vector (ncell,) or stack of vectors (ntimes, ncell)
+    '''
+
+    if operator not in ['mean', 'mode']:
+        raise ValueError('operator %s unknown' % operator)
+
+
+    # prepare input fields ...........................................
+    ishape = np.shape( ind )
+    npix = np.prod( ishape )
+    nstack = fstack.shape[:fstack.ndim - len( ishape )]
+
+    if fstack.shape[len( nstack ):] != ishape:
+        raise ValueError('field shape does not fit to index shape')
+
+    ind = np.asarray( ind ).ravel()
+    
+    data = np.ma.getdata( fstack ).reshape( (-1, npix) )
+    invalid = np.ma.getmaskarray( fstack ).reshape( (-1, npix) )
+
+    inside = (ind >= 0)
+
+    if fill_index is not None:
+        irow, icol = fill_index
+        has_pixel = (irow >= 0) & (icol >= 0)
+        ipix = np.ravel_multi_index( (np.where( has_pixel, irow, 0 ), 
+                                      np.where( has_pixel, icol, 0 )), ishape )
+    # ================================================================
+
+
+    # aggregation in time loop .......................................
+    vstack = np.zeros( (data.shape[0], ncell) )
+
+    for n in range( data.shape[0] ):
+        
+        valid = inside & ~invalid[n] & np.isfinite( data[n] )
+
+        i = ind[valid]
+        v = data[n][valid]
+
+        if operator == 'mean':
+            count = np.bincount( i, minlength = ncell )
+            total = np.bincount( i, weights = v, minlength = ncell )
+
+            vstack[n] = total / np.maximum( count, 1 )
+
+        elif operator == 'mode':
+            cats, icat = np.unique( v, return_inverse = True )
+            ncat = max( len( cats ), 1 )
+
+            hist = np.bincount( i * ncat + icat, minlength = ncell * ncat )
+            hist = hist.reshape( (ncell, ncat) )
+
+            count = hist.sum( axis = 1 )
+            if len( cats ) > 0:
+                vstack[n] = cats[ hist.argmax( axis = 1 ) ]
+
+        # fill cells without pixels
+        empty = (count == 0)
+        vstack[n, empty] = Nan
+
+        if fill_index is not None:
+            empty = empty & has_pixel
+
+            ifill = ipix[empty]
+            vfill = vstack[n, empty]
+            vfill = np.where( valid[ifill], data[n][ifill], vfill )
+            vstack[n, empty] = vfill
+    # ================================================================
+
+    return vstack.reshape( nstack + (ncell,) )
+
+######################################################################
+######################################################################
+
+
+def msevi2vector_dataset( dset, vgeo, variable_list, 
+                          operator = 'mean',
+                          region = SEVIRI_cutout,
+                          index_kwargs = {} ):
+
+    '''
+    Aggregates a set of Msevi fields (e.g. GERB-like fluxes or NWCSAF cloud
+    types) onto ICON vectors.
+
+
+    Parameters
+    ----------
+    dset : dict of numpy arrays
+        set of Msevi fields or stacks of fields (cutout with `region`)
+
+    vgeo : dict of numpy arrays
+        set of fields containing vector geo-reference
+
+    variable_list : list of str
+        list of variables which are aggregated
+
+    operator : str or dict, optional, default = 'mean'
+        aggregation operator (see `aggregate_msevi2vector`), a dict can be
+        used to set the operator per variable
+
+    region : tuble of int, optional, default = SEVIRI_cutout
+        cutout region defintion as ((ir1, ir2), (ic1, ic2))
+
+    index_kwargs : dict, optional, default = {}
+        optional keywords passed to `get_vector2msevi_index`
+
+
+    Returns
+    --------
+    vset : dict of numpy arrays
+        set of aggregated vectors including vector geo-reference
+    '''
+
+    # get index sets
+    ind = get_vector2msevi_index( vgeo, region = region, **index_kwargs )
+    fill_index = get_msevi2vector_index( vgeo, region = region, clip = False )
+
+    ncell = len( vgeo['lon'] )
+
+
+    # aggregation
+    vset = {}
+    for vname in variable_list:
+
+        if isinstance( operator, dict ):
+            op = operator.get( vname, 'mean' )
+        else:
+            op = operator
+
+        vset[vname] = aggregate_msevi2vector( dset[vname], ind, ncell, 
+                                              operator = op,
+                                              fill_index = fill_index )
+
+
+    # georef and time
+    vset['lon'] = vgeo['lon']
+    vset['lat'] = vgeo['lat']
+
+    if 'time' in dset:
+        vset['time'] = dset['time']
+
+    return vset
+
+######################################################################
+######################################################################
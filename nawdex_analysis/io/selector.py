@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 
 import os, sys, glob
+import fnmatch, sqlite3, threading
 import numpy as np
 
 import xarray as xr
 import netCDF4
 
-from ..config import nawdex_dir
-from ..io.tools import convert_time
+from ..config import nawdex_dir, cache_dir
+from ..io.tools import convert_time, ordered_map, netcdf_lock
 
 
 '''
@@ -138,7 +139,8 @@ def check_varname_and_time_in_nc( fname, varname, time ):
 
 def make_filetime_index( varname, tobject, 
                          filepart = '',
-                         subdirs = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like']):
+                         subdirs = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like'],
+                         use_catalog = True):
     
     '''
     The function generates an time index listing all filenames 
@@ -160,6 +162,12 @@ def make_filetime_index( varname, tobject,
     subdirs : list of str, optional,  default = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like']
         list of subdirectories where file search is done
 
+    use_catalog : bool, optional, default = True
+        if the netcdf metadata catalog is used instead of opening all files,
+        new or modified files are scanned sequentially in the calling 
+        process (for a full rescan with a process pool, call 
+        `update_nc_catalog` explicitly in advance)
+
 
     Returns
     --------
@@ -168,6 +176,20 @@ def make_filetime_index( varname, tobject,
     '''
 
     
+    # lookup in metadata catalog
+    if use_catalog:
+        # no worker pool is forked from a (possibly multithreaded) caller
+        update_nc_catalog( subdirs = subdirs, executor = None )
+
+        flist = query_nc_catalog( varname, tobject, filepart = filepart, subdirs = subdirs )
+
+        index = {}
+        if flist:
+            index[tobject] = flist
+
+        return index
+
+
     # gather full filelist
     flist = []
 
@@ -495,3 +517,266 @@ def convert_explist2idlist( explist ):
 ######################################################################
 ######################################################################
 
+
+
+######################################################################
+# (3) NetCDF Metadata Catalog
+######################################################################
+
+
+# name of catalog database
+nc_catalog_file = '%s/catalog/nc_catalog.sqlite' % cache_dir
+
+# one database connection per thread (and process, connections must not
+# be reused in forked workers)
+nc_catalog_connections = threading.local()
+
+
+def get_nc_catalog_connection( dbfile = None ):
+
+    '''
+    Returns connection to the netcdf metadata catalog (created if needed).
+
+
+    Parameters
+    ----------
+    dbfile : str, optional, default = None
+        name of catalog database, `nc_catalog_file` if None
+
+
+    Returns
+    --------
+    con : sqlite3.Connection
+        database connection (one per process, thread and database)
+    '''
+
+    if dbfile is None:
+        dbfile = nc_catalog_file
+
+    if not hasattr( nc_catalog_connections, 'store' ):
+        nc_catalog_connections.store = {}
+
+    # thread-local store is inherited by forked children
+    key = ( os.getpid(), dbfile )
+
+    if key in nc_catalog_connections.store:
+        return nc_catalog_connections.store[key]
+
+    dbdir = os.path.dirname( dbfile )
+    if dbdir and not os.path.isdir( dbdir ):
+        os.makedirs( dbdir, exist_ok = True )
+
+    con = sqlite3.connect( dbfile, timeout = 60. )
+
+    with con:
+        con.executescript( '''
+            CREATE TABLE IF NOT EXISTS files ( fname TEXT PRIMARY KEY, dname TEXT, 
+                                               ipos INTEGER, mtime REAL, size INTEGER );
+            CREATE TABLE IF NOT EXISTS variables ( fname TEXT, varname TEXT );
+            CREATE TABLE IF NOT EXISTS times ( fname TEXT, tfloat REAL );
+            CREATE INDEX IF NOT EXISTS files_dname ON files ( dname );
+            CREATE INDEX IF NOT EXISTS variables_varname ON variables ( varname, fname );
+            CREATE INDEX IF NOT EXISTS variables_fname ON variables ( fname );
+            CREATE INDEX IF NOT EXISTS times_tfloat ON times ( tfloat, fname );
+            CREATE INDEX IF NOT EXISTS times_fname ON times ( fname );
+            ''' )
+
+    nc_catalog_connections.store[key] = con
+
+    return con
+
+######################################################################
+######################################################################
+
+
+def scan_nc_file( fname ):
+
+    '''
+    Reads variable names and (raw) time values of a netcdf file.
+
+
+    Parameters
+    ----------
+    fname : str
+        name of file
+
+
+    Returns
+    --------
+    varnames : list of str
+        variable names
+
+    times : list of float
+        values of time variable (as stored in file, missing values dropped)
+    '''
+
+    # file access is serialized between threads (see `tools.netcdf_lock`)
+    with netcdf_lock, netCDF4.Dataset( fname, 'r' ) as f:
+        varnames = list( f.variables.keys() )
+
+        if 'time' in f.variables:
+            t = np.ma.filled( np.ma.atleast_1d( f.variables['time'][:] ).astype( np.float64 ), np.nan )
+            times = [ float( tf ) for tf in t.ravel() if not np.isnan( tf ) ]
+        else:
+            times = []
+
+    return varnames, times
+
+######################################################################
+######################################################################
+
+
+def update_nc_catalog( subdirs = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like'],
+                       nworkers = 8,
+                       executor = 'process',
+                       dbfile = None ):
+
+    '''
+    Updates the netcdf metadata catalog for a set of subdirectories.
+
+    Directories are listed and all files are checked by modification time
+    and size on each update (files rewritten in place do not change the
+    directory). New and modified files are scanned in parallel, entries of
+    removed files are deleted.
+
+
+    Parameters
+    ----------
+    subdirs : list of str, optional,  default = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like']
+        list of subdirectories of `nawdex_dir`
+
+    nworkers : int, optional, default = 8
+        number of workers used for scanning
+
+    executor : str, optional, default = 'process'
+        type of worker pool (see `tools.ordered_map`)
+
+    dbfile : str, optional, default = None
+        name of catalog database, `nc_catalog_file` if None
+
+
+    Returns
+    --------
+    None
+    '''
+
+    con = get_nc_catalog_connection( dbfile = dbfile )
+
+    for sdir in subdirs:
+
+        dname = '%s/%s' % (nawdex_dir, sdir)
+
+        if not os.path.isdir( dname ):
+            continue
+
+        # list directory (in the same order as glob) -----------------
+        names = [ e.name for e in os.scandir( dname ) 
+                  if e.name.endswith( '.nc' ) and not e.name.startswith( '.' ) ]
+
+        listing = {}
+        for ipos, name in enumerate( names ):
+            fname = '%s/%s' % (dname, name)
+            st = os.stat( fname )
+            listing[fname] = (ipos, st.st_mtime, st.st_size)
+
+        known = dict( [ (fname, (ipos, fmtime, fsize)) for fname, ipos, fmtime, fsize in
+                        con.execute( 'SELECT fname, ipos, mtime, size FROM files WHERE dname = ?', 
+                                     (dname,) ) ] )
+
+        removed = [ fname for fname in known if fname not in listing ]
+        changed = [ fname for fname in listing 
+                    if known.get( fname, (None,) )[1:] != listing[fname][1:] ]
+        moved = [ fname for fname in listing 
+                  if fname in known and known[fname][0] != listing[fname][0] ]
+
+        if not ( removed or changed or moved ):
+            continue
+        # ============================================================
+
+
+        # scan new and modified files in parallel --------------------
+        scans = ordered_map( scan_nc_file, changed, executor = executor, nworkers = nworkers )
+
+        with con:
+            for fname in removed + changed:
+                con.execute( 'DELETE FROM files WHERE fname = ?', (fname,) )
+                con.execute( 'DELETE FROM variables WHERE fname = ?', (fname,) )
+                con.execute( 'DELETE FROM times WHERE fname = ?', (fname,) )
+
+            for fname, (varnames, times) in zip( changed, scans ):
+                ipos, fmtime, fsize = listing[fname]
+
+                con.execute( 'INSERT INTO files VALUES (?, ?, ?, ?, ?)', 
+                             (fname, dname, ipos, fmtime, fsize) )
+                con.executemany( 'INSERT INTO variables VALUES (?, ?)', 
+                                 [ (fname, v) for v in varnames ] )
+                con.executemany( 'INSERT INTO times VALUES (?, ?)', 
+                                 [ (fname, tf) for tf in times ] )
+
+            # update positions (listing order)
+            con.executemany( 'UPDATE files SET ipos = ? WHERE fname = ?', 
+                             [ (listing[fname][0], fname) for fname in moved ] )
+        # ============================================================
+
+    return
+
+######################################################################
+######################################################################
+
+
+def query_nc_catalog( varname, tobject, 
+                      filepart = '',
+                      subdirs = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like'],
+                      dbfile = None ):
+
+    '''
+    Lists files which contain a variable and a time slot (from the netcdf 
+    metadata catalog).
+
+
+    Parameters
+    ----------
+    varname : str
+        considered variable name
+    
+    tobject : datetime object
+        selected time slot
+
+    filepart : str
+        a part of the filename given as substring to select
+        only a subset of files
+
+    subdirs : list of str, optional,  default = ['meteosat', 'synsat', 'sim-toarad', 'gerb-like']
+        list of subdirectories of `nawdex_dir`
+
+    dbfile : str, optional, default = None
+        name of catalog database, `nc_catalog_file` if None
+
+
+    Returns
+    --------
+    flist : list of str
+        list of filenames (in the order of a directory search)
+    '''
+
+    con = get_nc_catalog_connection( dbfile = dbfile )
+
+    tfloat = float( convert_time( tobject ) )
+    pattern = '*%s*.nc' % filepart
+
+    flist = []
+    for sdir in subdirs:
+        dname = '%s/%s' % (nawdex_dir, sdir)
+
+        rows = con.execute( '''SELECT fname FROM files WHERE dname = ? 
+                               AND fname IN (SELECT fname FROM variables WHERE varname = ?)
+                               AND fname IN (SELECT fname FROM times WHERE tfloat = ?)
+                               ORDER BY ipos''', (dname, varname, tfloat) )
+
+        flist += [ fname for (fname,) in rows 
+                   if fnmatch.fnmatchcase( os.path.basename( fname ), pattern ) ]
+
+    return flist
+
+######################################################################
+######################################################################
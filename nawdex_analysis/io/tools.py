@@ -11,6 +11,11 @@ Set of tools for IO of either obs or sim.
 ######################################################################
 ######################################################################
 
+import os
+import hashlib
+import collections
+import queue, threading
+import concurrent.futures
 import numpy as np
 import datetime
 
@@ -215,3 +220,429 @@ def lonlat2azizen(lon, lat):
 
 ######################################################################
 ######################################################################
+
+def lonlat2zenmask(lon, lat, zen_max = 75.):
+
+    '''
+    Calculates mask of satellite zenith angles below a limit without 
+    computing the angles. Assumes sub-satellite longitude at zero degree E.
+
+    Zenith angle increases with the great-circle distance delta to the 
+    sub-satellite point, hence zen <= zen_max is equivalent to 
+    cos(lat) * cos(lon) >= cos(delta_max). Due to rounding, cells very 
+    close to the limit can differ from the direct test on the angles.
+
+
+    Parameters
+    ----------
+    lon : float or numpy array
+        longitude
+   
+    lat : float or numpy array
+        latitude
+
+    zen_max : float, optional, default = 75.
+        maximum satellite zenith angle
+
+
+    Returns
+    -------
+    mask : bool or numpy array
+        True where satellite zenith angle <= zen_max (False for invalid 
+        lon / lat)
+    '''
+
+# satellite height and earth radius ..................................
+    H = 42164
+    R = 6378
+
+# great circle distance for maximum zenith angle .....................
+    zen_max = np.deg2rad( zen_max )
+    delta_max = zen_max - np.arcsin( R * np.sin( zen_max ) / H )
+
+    lon, lat = np.deg2rad(lon), np.deg2rad(lat)
+
+    return np.cos(lat) * np.cos(lon) >= np.cos( delta_max )
+
+######################################################################
+######################################################################
+
+
+# bounded cache of viewing geometries (least recently used grids are dropped)
+geometry_cache = collections.OrderedDict()
+geometry_cache_lock = threading.Lock()
+geometry_cache_size = 8
+
+
+def grid_key( lon, lat ):
+
+    '''
+    Returns key which identifies a grid by the content of lon / lat.
+
+
+    Parameters
+    ----------
+    lon : numpy array
+        longitude
+   
+    lat : numpy array
+        latitude
+
+
+    Returns
+    -------
+    key : tuple
+        shape and hash of grid
+    '''
+
+    h = hashlib.sha1()
+    for v in [lon, lat]:
+        h.update( np.ascontiguousarray( np.ma.getdata( v ) ).view( np.uint8 ) )
+
+    return ( np.shape( lon ), h.hexdigest() )
+
+######################################################################
+######################################################################
+
+
+def cached_geometry( key, func ):
+
+    '''
+    Looks up entry of geometry cache and calculates it if missing.
+
+
+    Parameters
+    ----------
+    key : tuple
+        cache key
+
+    func : function
+        calculates entry (without arguments)
+
+
+    Returns
+    -------
+    entry : numpy array or tuple of numpy arrays
+        cached entry (read-only)
+    '''
+
+    with geometry_cache_lock:
+        if key in geometry_cache:
+            geometry_cache.move_to_end( key )
+            return geometry_cache[key]
+
+    entry = func()
+
+    for v in entry if isinstance( entry, tuple ) else (entry,):
+        v.flags.writeable = False
+
+    with geometry_cache_lock:
+        geometry_cache[key] = entry
+        geometry_cache.move_to_end( key )
+
+        while len( geometry_cache ) > geometry_cache_size:
+            geometry_cache.popitem( last = False )
+
+    return entry
+
+######################################################################
+######################################################################
+
+
+def get_viewing_geometry( lon, lat, key = None, dtype = np.float32 ):
+
+    '''
+    Returns satellite azimuth and zenith angle of a grid, computed once 
+    per grid (see `lonlat2azizen`).
+
+
+    Parameters
+    ----------
+    lon : numpy array
+        longitude
+   
+    lat : numpy array
+        latitude
+
+    key : hashable, optional, default = None
+        identity of grid (e.g. grid file name or region), if None the 
+        grid is identified by its content (see `grid_key`)
+
+    dtype : numpy dtype, optional, default = np.float32
+        data type of angles
+
+
+    Returns
+    -------
+    azi : numpy array
+        satellite azimuth angle (read-only, NaN for invalid lon / lat)
+    
+    zen : numpy array
+        satellite zenith angle (read-only, NaN for invalid lon / lat)
+    '''
+
+    if key is None:
+        key = grid_key( lon, lat )
+
+    def calc():
+        lon_d = np.ma.filled( np.ma.asarray( lon, dtype = np.float64 ), np.nan )
+        lat_d = np.ma.filled( np.ma.asarray( lat, dtype = np.float64 ), np.nan )
+
+        with np.errstate( invalid = 'ignore' ):
+            azi, zen = lonlat2azizen( lon_d, lat_d )
+
+        return azi.astype( dtype ), zen.astype( dtype )
+
+    return cached_geometry( ('geometry', key, np.dtype( dtype ).str), calc )
+
+######################################################################
+######################################################################
+
+
+def get_zenith_mask( lon, lat, zen_max = 75., key = None ):
+
+    '''
+    Returns mask of satellite zenith angles below a limit, computed once 
+    per grid. The test zen <= zen_max is done on float64 angles from 
+    `lonlat2azizen`, i.e. the mask is exactly the same as for the angles
+    themselves (`lonlat2zenmask` can differ at the boundary by rounding).
+
+
+    Parameters
+    ----------
+    lon : numpy array
+        longitude
+   
+    lat : numpy array
+        latitude
+
+    zen_max : float, optional, default = 75.
+        maximum satellite zenith angle
+
+    key : hashable, optional, default = None
+        identity of grid (e.g. grid file name or region), if None the 
+        grid is identified by its content (see `grid_key`)
+
+
+    Returns
+    -------
+    mask : numpy array, bool
+        True where satellite zenith angle <= zen_max (read-only)
+    '''
+
+    if key is None:
+        key = grid_key( lon, lat )
+
+    def calc():
+        lon_d = np.ma.filled( np.ma.asarray( lon, dtype = np.float64 ), np.nan )
+        lat_d = np.ma.filled( np.ma.asarray( lat, dtype = np.float64 ), np.nan )
+
+        with np.errstate( invalid = 'ignore' ):
+            azi, zen = lonlat2azizen( lon_d, lat_d )
+
+            return np.asarray( zen <= zen_max )
+
+    return cached_geometry( ('zenmask', key, zen_max), calc )
+
+######################################################################
+######################################################################
+
+
+def clear_geometry_cache():
+
+    '''
+    Empties the cache of viewing geometries.
+    '''
+
+    with geometry_cache_lock:
+        geometry_cache.clear()
+
+    return
+
+######################################################################
+######################################################################
+
+
+# serializes netcdf / hdf5 library calls of all threads in one process
+# (netcdf-c and hdf5 are not thread-safe), shared by readers and writers
+netcdf_lock = threading.RLock()
+
+
+def ordered_map( func, items, 
+                 executor = None, 
+                 nworkers = None, 
+                 initializer = None, 
+                 initargs = (),
+                 max_pending = None ):
+
+    '''
+    Applies function to a sequence of items, optionally in a thread or 
+    process pool. Results are yielded in input order.
+
+
+    Parameters
+    ----------
+    func : function
+        function applied to each item (has to be picklable for process pools)
+
+    items : iterable
+        sequence of input items
+
+    executor : str, optional, default = None
+        type of pool, either
+
+        * None: sequential processing in the calling thread
+        * 'thread': thread pool
+        * 'process': process pool
+
+    nworkers : int, optional, default = None
+        number of workers (None uses the number of CPUs)
+
+    initializer : function, optional, default = None
+        called once per worker with `initargs`, e.g. to share large 
+        read-only data without pickling it for every task
+        (for executor = None it is called once in the calling process)
+
+    initargs : tuple, optional, default = ()
+        arguments passed to initializer
+
+    max_pending : int, optional, default = None
+        maximal number of submitted, but not yet consumed tasks 
+        (bounds memory), default is 2 * nworkers
+
+
+    Returns
+    --------
+    results : generator
+        yields func(item) for all items (in order)
+    '''
+
+    # sequential processing ..........................................
+    if executor is None:
+
+        if initializer is not None:
+            initializer( *initargs )
+
+        for item in items:
+            yield func( item )
+
+        return
+    # ================================================================
+
+
+    # pool processing ................................................
+    if executor == 'thread':
+        pool_class = concurrent.futures.ThreadPoolExecutor
+    elif executor == 'process':
+        pool_class = concurrent.futures.ProcessPoolExecutor
+    else:
+        raise ValueError('executor %s unknown' % executor)
+
+    if nworkers is None:
+        nworkers = os.cpu_count()
+
+    if max_pending is None:
+        max_pending = 2 * nworkers
+
+
+    with pool_class( max_workers = nworkers, 
+                     initializer = initializer, 
+                     initargs = initargs ) as pool:
+
+        pending = collections.deque()
+
+        for item in items:
+            pending.append( pool.submit( func, item ) )
+
+            if len( pending ) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    # ================================================================
+
+    return
+
+######################################################################
+######################################################################
+
+
+def queued_consumer( consumer, items, queue_size = 2 ):
+
+    '''
+    Runs a consumer in a background thread which is fed from the calling 
+    thread through a bounded queue, e.g. to write finished time steps while 
+    the next ones are computed.
+
+    The calling thread blocks if the queue is full (back-pressure), i.e. at
+    most queue_size items wait for the consumer.
+
+
+    Parameters
+    ----------
+    consumer : function
+        function which takes an iterable and consumes all of its items
+
+    items : iterable
+        sequence of input items (generated in the calling thread)
+
+    queue_size : int, optional, default = 2
+        maximal number of items waiting in the queue
+
+
+    Returns
+    --------
+    None
+    '''
+
+    q = queue.Queue( maxsize = queue_size )
+    stop = object()
+    errors = []
+    finished = []
+
+
+    def queue_iter():
+        while True:
+            item = q.get()
+
+            if item is stop:
+                finished.append( True )
+                return
+
+            yield item
+
+
+    def run():
+        try:
+            consumer( queue_iter() )
+        except BaseException as e:
+            errors.append( e )
+
+        # drain queue such that the calling thread is not blocked
+        if not finished:
+            while q.get() is not stop:
+                pass
+
+
+    thread = threading.Thread( target = run )
+    thread.start()
+
+    try:
+        for item in items:
+
+            if errors:
+                break
+
+            q.put( item )
+
+    finally:
+        q.put( stop )
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return
+
+######################################################################
+######################################################################